@@ -1,17 +1,23 @@
-from fastapi import FastAPI, HTTPException,Depends, Header, Query
+from fastapi import FastAPI, HTTPException,Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional
 import os
 from dotenv import load_dotenv
 import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import requests
 import pandas as pd
-import joblib
+import numpy as np
 import psycopg2
 from cryptography.fernet import Fernet
 from datetime import datetime, timezone
 from jose import jwt, JWTError
 from typing import Annotated
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # データベース設定
 DB_HOST     = os.getenv("DB_HOST")
@@ -41,8 +47,56 @@ class AllPlaylistsResponse(BaseModel):
     message: str
     playlists: Optional[dict] = None
     spotify_playlist_urls: Optional[dict] = None
+    spotify_write_results: Optional[dict] = None  # 組み合わせごとの書き込み結果（成否・所要時間・エラー）
+    fetch_stats: Optional[dict] = None  # 楽曲特徴量の取得結果（キャッシュヒット数・失敗数など）
+    job_id: Optional[str] = None  # background=true の場合のジョブID
     error: Optional[str] = None
 
+# 1組の感情のプレイリストのレスポンスモデル
+class PairPlaylistResponse(BaseModel):
+    success: bool
+    message: str
+    current_mood: str
+    target_mood: str
+    playlist: Optional[list] = None
+    spotify_playlist_url: Optional[str] = None
+    spotify_write_result: Optional[dict] = None  # 書き込み結果（成否・所要時間・エラー）
+    fetch_stats: Optional[dict] = None
+    error: Optional[str] = None
+
+# ジョブの状態のレスポンスモデル
+class ClassifyJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued / running / succeeded / failed
+    stage: Optional[str] = None  # collecting_tracks / fetching_features / scoring / writing_playlists / done
+    progress: dict = {}
+    result: Optional[AllPlaylistsResponse] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+# ブロッキング処理（Soundstat・Spotify・DB・推論）を実行するスレッド数の上限
+# イベントループはこれらを待つだけなので、/health などは処理中も応答できる
+CLASSIFY_MAX_CONCURRENCY = int(os.getenv("CLASSIFY_MAX_CONCURRENCY", "8"))
+SPOTIFY_WRITE_MAX_CONCURRENCY = int(os.getenv("SPOTIFY_WRITE_MAX_CONCURRENCY", "8"))
+
+classify_executor = ThreadPoolExecutor(max_workers=CLASSIFY_MAX_CONCURRENCY, thread_name_prefix="classify")
+spotify_write_executor = ThreadPoolExecutor(max_workers=SPOTIFY_WRITE_MAX_CONCURRENCY, thread_name_prefix="spotify-write")
+
+# 16個のプレイリストの書き込みを並行して行うスレッド数と、Spotify APIの呼び出しレート（全リクエストで共有）
+SPOTIFY_WRITE_PAIR_CONCURRENCY = int(os.getenv("SPOTIFY_WRITE_PAIR_CONCURRENCY", "6"))
+SPOTIFY_WRITE_RATE_PER_SEC = float(os.getenv("SPOTIFY_WRITE_RATE_PER_SEC", "10"))
+SPOTIFY_WRITE_MAX_RETRIES = int(os.getenv("SPOTIFY_WRITE_MAX_RETRIES", "3"))
+
+spotify_write_pair_executor = ThreadPoolExecutor(
+    max_workers=SPOTIFY_WRITE_PAIR_CONCURRENCY, thread_name_prefix="spotify-write-pair"
+)
+
+async def run_blocking(executor: ThreadPoolExecutor, fn, *args, **kwargs):
+    """ブロッキングな関数を指定したスレッドプールで実行し、イベントループを止めずに結果を待つ。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
 # 利用可能な感情のリスト
 AVAILABLE_MOODS = ['Angry/Frustrated', 'Happy/Excited', 'Relax/Chill', 'Tired/Sad']
 
@@ -51,9 +105,61 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from spotify_utils import get_playlist_tracks
-from recommend import recommend_songs_for_target
-from pre_process_normalize import process_tracks_directly
+from spotify_utils import (
+    PLAYLIST_TRACK_ID_FIELDS, get_playlist_snapshot_ids, get_playlists_tracks, get_spotify_access_token
+)
+from recommend import select_top_tracks
+from pre_process_normalize import process_tracks_to_matrix
+from model_registry import ModelRegistry
+from score_cache import TransitionScoreCache
+from inference_batcher import InferenceBatcher
+from result_cache import ClassifyResultCache, make_result_key
+from rate_limiter import (
+    RETRYABLE_STATUS_CODES, AdaptiveRateLimiter, ThrottledError, backoff_delay, parse_retry_after
+)
+from job_store import (
+    JobStore, STAGE_COLLECTING_TRACKS, STAGE_FETCHING_FEATURES, STAGE_SCORING, STAGE_WRITING_PLAYLISTS
+)
+
+# 開始感情ごとのモデルを起動時に読み込み、メモリ上に保持する
+model_registry = ModelRegistry(AVAILABLE_MOODS)
+
+# 楽曲ごとの遷移確率のキャッシュ（モデルが差し替わったら破棄する）
+score_cache = TransitionScoreCache()
+model_registry.add_reload_listener(lambda version: score_cache.clear())
+
+# プレイリストの組（snapshot_id込み）ごとの16個のプレイリストの生成結果
+result_cache = ClassifyResultCache()
+model_registry.add_reload_listener(lambda version: result_cache.clear())
+
+# 同時に処理中のリクエストの特徴量をまとめて推論する
+inference_batcher = InferenceBatcher()
+
+# Spotifyへの書き込み（ユーザーのプレイリストの作成・更新）のレート制限
+spotify_write_limiter = AdaptiveRateLimiter(
+    rate=SPOTIFY_WRITE_RATE_PER_SEC, max_concurrency=SPOTIFY_WRITE_PAIR_CONCURRENCY
+)
+
+# Spotifyへの書き込みで全リクエストが共有するセッション（接続を使い回す）
+# spotipyにセッションを作らせるとurllib3のRetryが組み込まれ、429がヘッダーなしのRetryErrorとして届くため、
+# リトライを含まないセッションを渡し、リトライは call_spotify で行う
+spotify_write_session = requests.Session()
+_spotify_write_adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=SPOTIFY_WRITE_PAIR_CONCURRENCY)
+spotify_write_session.mount("https://", _spotify_write_adapter)
+spotify_write_session.mount("http://", _spotify_write_adapter)
+
+# バックグラウンドで実行中・完了したプレイリスト生成ジョブ
+classify_jobs = JobStore()
+
+@app.on_event("startup")
+async def load_models():
+    await run_blocking(classify_executor, model_registry.load_all)
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    classify_executor.shutdown(wait=False)
+    spotify_write_executor.shutdown(wait=False)
+    spotify_write_pair_executor.shutdown(wait=False)
 
 def get_current_user(authorization: str = Header(..., alias="Authorization")) -> str:
     scheme, _, token = authorization.partition(" ")
@@ -68,44 +174,50 @@ def get_current_user(authorization: str = Header(..., alias="Authorization")) ->
     except JWTError as e:
         raise HTTPException(401, f"Token validation failed: {e}")
 
-def normalize_scores(
-    recommendations: List[Tuple[str, float]]
-) -> List[Tuple[str, float]]:
-    """
-    移行確率のリストを0から100のスケールの移行スコアに正規化する関数。
-    """
-    if not recommendations or len(recommendations) < 2:
-        if recommendations:
-            track_id, _ = recommendations[0]
-            return [(track_id, 50.0)]
-        return []
-
-    probabilities = [prob for _, prob in recommendations]
-    min_prob = min(probabilities)
-    max_prob = max(probabilities)
-    
-    if min_prob == max_prob:
-        return [(track_id, 50.0) for track_id, _ in recommendations]
-
-    normalized_list = []
-    for track_id, prob in recommendations:
-        score = ((prob - min_prob) / (max_prob - min_prob)) * 100
-        normalized_list.append((track_id, score))
-        
-    normalized_list.sort(key=lambda item: item[1], reverse=True)
-    return normalized_list
-
+def is_valid_playlist_id(playlist_id: str) -> bool:
+    return bool(playlist_id) and len(playlist_id) >= 10  # SpotifyプレイリストIDは通常22文字
 
+def validated_playlist_ids(
+    playlistIDs: Annotated[List[str], Query(..., alias="playlistIDs")]
+) -> List[str]:
+    """クエリの playlistIDs を検証して返す依存関数（空の場合・無効なIDを含む場合は400）"""
+    if not playlistIDs:
+        raise HTTPException(status_code=400, detail="プレイリストIDのリストを指定してください")
+    for playlist_id in playlistIDs:
+        if not is_valid_playlist_id(playlist_id):
+            raise HTTPException(status_code=400, detail=f"無効なプレイリストIDが含まれています: {playlist_id}")
+    return playlistIDs
 
 def generate_all_playlists_from_multiple_sources(
-    playlist_ids: List[str]
+    playlist_ids: List[str],
+    stats: Optional[dict] = None,
+    on_playlist: Optional[Callable[[str, str, dict], None]] = None,
+    start_moods: Optional[List[str]] = None,
+    target_moods: Optional[List[str]] = None
 ) -> dict:
     """
     複数のプレイリストIDから楽曲を統合して、4つの感情状態の組み合わせで16個のプレイリストを生成する関数
+
+    Args:
+        playlist_ids: プレイリストIDのリスト
+        stats: 指定した場合、楽曲特徴量の取得結果（キャッシュヒット数・失敗数など）と
+            処理の段階・進捗（stage, tracks_collected, tracks_scored, pairs_scored, result_cache_hit）を処理中に書き込む
+        on_playlist: 指定した場合、各組み合わせのプレイリストが完成するたびに
+            (現在の気分, 目標の気分, プレイリストの結果) で呼び出す
+        start_moods: 生成する現在の気分（省略時は全て）。指定した気分のモデルだけで推論する
+        target_moods: 生成する目標の気分（省略時は全て）
     """
+    start_moods = list(start_moods or AVAILABLE_MOODS)
+    target_moods = list(target_moods or AVAILABLE_MOODS)
+    all_start_moods = start_moods == AVAILABLE_MOODS
+    all_pairs = all_start_moods and target_moods == AVAILABLE_MOODS
+
+    stats = {} if stats is None else stats
+    stats.update({"stage": STAGE_COLLECTING_TRACKS, "tracks_collected": 0, "tracks_scored": 0, "pairs_scored": 0})
+
     # プレイリストIDの検証
     for playlist_id in playlist_ids:
-        if not playlist_id or len(playlist_id) < 10:  # SpotifyプレイリストIDは通常22文字
+        if not is_valid_playlist_id(playlist_id):
             raise ValueError(f"無効なプレイリストIDが含まれています: {playlist_id}")
 
     try:
@@ -115,24 +227,60 @@ def generate_all_playlists_from_multiple_sources(
         if not client_id or not client_secret:
             raise ValueError("SPOTIFY_CLIENT_IDとSPOTIFY_CLIENT_SECRETが設定されていません。")
             
-        auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
-        access_token = auth_manager.get_access_token(as_dict=False)
+        # プロセス内で共有しているトークンを使う（期限が近い場合のみ取り直す）
+        access_token = get_spotify_access_token()
+
+        # リクエスト中は同じバージョンのモデルと前処理パラメータを使う
+        scorer, preprocessor, model_version = model_registry.pipeline_snapshot()
+
+        # 学習時の前処理パラメータがある場合のみ、楽曲の遷移確率はその楽曲だけで決まるためキャッシュできる
+        preprocessing_version = preprocessor.version if preprocessor is not None else None
+
+        # 全てのプレイリストの snapshot_id とモデルが前回と同じであれば、保存済みの結果を返す
+        snapshot_ids = get_playlist_snapshot_ids(sorted(set(playlist_ids)), access_token)
+        result_key = None
+        if preprocessing_version is not None and len(snapshot_ids) == len(set(playlist_ids)):
+            result_key = make_result_key(snapshot_ids, model_version, preprocessing_version)
+        cached = result_cache.get(result_key) if result_key is not None else None
+        stats["result_cache_hit"] = cached is not None
+        if cached is not None:
+            print(f"情報: プレイリストに変更がないため、保存済みの生成結果を返します。(モデルバージョン: {model_version})")
+            cached_playlists = cached["playlists"]
+            stats["tracks_collected"] = cached["tracks_collected"]
+            stats["stage"] = STAGE_SCORING
+            # 一部の組み合わせのみ要求された場合も、全組み合わせの保存済み結果から取り出す
+            requested_playlists = {}
+            for current_mood in start_moods:
+                requested_playlists[current_mood] = {}
+                for target_mood in target_moods:
+                    result = cached_playlists[current_mood][target_mood]
+                    requested_playlists[current_mood][target_mood] = result
+                    stats["pairs_scored"] += 1
+                    if on_playlist is not None:
+                        on_playlist(current_mood, target_mood, result)
+            return requested_playlists
 
         # 全てのプレイリストから楽曲を収集
         all_track_ids = []
         
         print(f"情報: {len(playlist_ids)}個のプレイリストから楽曲を収集中...")
+
+        # 全てのプレイリストの全ページを並行して取得する
+        # 分類には楽曲IDしか使わないため、IDとページ情報のみを要求する
+        # snapshot_id が前回と同じプレイリストは保存済みの楽曲一覧を使う
+        items_by_playlist = get_playlists_tracks(
+            playlist_ids, access_token, fields=PLAYLIST_TRACK_ID_FIELDS, snapshot_ids=snapshot_ids
+        )
         
         for i, playlist_id in enumerate(playlist_ids):
             try:
-                print(f"情報: プレイリスト {i+1}/{len(playlist_ids)} '{playlist_id}' からトラックを取得中...")
-                
-                playlist_items = get_playlist_tracks(playlist_id, access_token)
+                playlist_items = items_by_playlist.get(playlist_id, [])
                 track_ids = [item['track']['id'] for item in playlist_items if item.get('track') and item['track'].get('id')]
                 
                 if track_ids:
                     all_track_ids.extend(track_ids)
-                    print(f"情報: {len(track_ids)} 曲を取得しました。")
+                    stats["tracks_collected"] += len(track_ids)
+                    print(f"情報: プレイリスト {i+1}/{len(playlist_ids)} '{playlist_id}' から {len(track_ids)} 曲を取得しました。")
                 else:
                     print(f"警告: プレイリスト {playlist_id} からトラックを取得できませんでした。")
                     
@@ -148,47 +296,93 @@ def generate_all_playlists_from_multiple_sources(
         print(f"情報: 合計 {len(unique_track_ids)} 曲のユニークな楽曲を収集しました。")
         
         # 楽曲の特徴を処理
+        stats["score_cache_hits"] = 0
+
+        # 特徴量のマイクロバッチが届くたびに推論して、全楽曲の（開始感情 x 目標感情）遷移確率テンソルを組み立てる
+        tensor_batches = []
+        scoring_errors = {}
+        start_indices = [AVAILABLE_MOODS.index(mood) for mood in start_moods]
+
+        def predict_batch(X_batch):
+            try:
+                return inference_batcher.predict(scorer, X_batch, start_moods)
+            except Exception as e:
+                print(f"警告: まとめて推論できませんでした。開始感情ごとに推論し直します: {e}")
+            # 失敗した場合は開始感情ごとに推論し、失敗したモデルの組み合わせだけをエラーにする
+            probs = np.full((len(X_batch), len(start_moods), len(AVAILABLE_MOODS)), np.nan)
+            for start_index, current_mood in enumerate(start_moods):
+                if current_mood in scoring_errors:
+                    continue
+                try:
+                    probs[:, start_index, :] = scorer.predict(X_batch, [current_mood])[:, 0, :]
+                except Exception as e:
+                    scoring_errors[current_mood] = str(e)
+            return probs
+
+        def score_batch(batch_track_ids, X_batch):
+            stats["tracks_scored"] += len(batch_track_ids)
+            if preprocessing_version is None:
+                tensor_batches.append(predict_batch(X_batch))
+                return
+
+            # キャッシュにない楽曲だけを推論する
+            hit_mask, hits = score_cache.get_many(batch_track_ids, model_version, preprocessing_version)
+            probs = np.empty((len(X_batch), len(start_moods), len(AVAILABLE_MOODS)), dtype=np.float32)
+            if hits:
+                probs[hit_mask] = np.stack(hits)[:, start_indices]
+                stats["score_cache_hits"] += len(hits)
+            miss_mask = ~hit_mask
+            if miss_mask.any():
+                miss_probs = predict_batch(X_batch[miss_mask])
+                probs[miss_mask] = miss_probs
+                # キャッシュには全ての開始感情の4x4行列のみ保存する
+                if all_start_moods and not np.isnan(miss_probs).any():
+                    score_cache.put_many(batch_track_ids[miss_mask], miss_probs, model_version, preprocessing_version)
+            tensor_batches.append(probs)
+
         print("情報: 楽曲の特徴を処理中...")
-        processed_df = process_tracks_directly(unique_track_ids)
+        stats["stage"] = STAGE_FETCHING_FEATURES
+        playlist_track_ids, _ = process_tracks_to_matrix(
+            unique_track_ids, stats=stats, on_batch=score_batch, preprocessor=preprocessor
+        )
 
-        if processed_df.empty:
+        if len(playlist_track_ids) == 0:
             raise ValueError("楽曲の特徴を処理できませんでした。")
 
-        playlist_track_ids = processed_df['id'].values
-        X_playlist = processed_df.drop(columns=['id', 'name', 'artists'])
+        # shape: (楽曲数, 開始感情, 目標感情)
+        transition_tensor = np.concatenate(tensor_batches, axis=0)
         
         all_playlists = {}
+        stats["stage"] = STAGE_SCORING
         
         # 4つの感情状態の組み合わせで16個のプレイリストを生成
-        print("情報: 16個のプレイリストを生成中...")
-        for current_mood in AVAILABLE_MOODS:
+        print(f"情報: {len(start_moods) * len(target_moods)}個のプレイリストを生成中... (モデルバージョン: {model_version})")
+        for start_index, current_mood in enumerate(start_moods):
             all_playlists[current_mood] = {}
             
-            for target_mood in AVAILABLE_MOODS:
+            for target_mood in target_moods:
+                target_index = AVAILABLE_MOODS.index(target_mood)
                 try:
-                    model_filename = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), f"model/model_{current_mood.replace('/', '-')}.joblib")
-                    model = joblib.load(model_filename)
-                    
-                    mood_map = {'Angry/Frustrated': 0, 'Happy/Excited': 1, 'Relax/Chill': 2, 'Tired/Sad': 3}
-                    target_mood_code = mood_map[target_mood]
-                    
-                    recommended_playlist_with_probs = recommend_songs_for_target(
-                        model=model, X=X_playlist, track_ids=playlist_track_ids,
-                        target_mood_code=target_mood_code, top_k=10000
+                    if current_mood in scoring_errors:
+                        raise ValueError(scoring_errors[current_mood])
+
+                    # 0-100の移行スコアに正規化し、スコアが45より大きい楽曲のみ残す
+                    filtered_playlist = select_top_tracks(
+                        track_ids=playlist_track_ids,
+                        target_probs=transition_tensor[:, start_index, target_index],
+                        top_k=10000,
+                        min_score=45
                     )
                     
-                    final_scored_playlist = normalize_scores(recommended_playlist_with_probs)
-                    # 只保留score大于45的歌曲
-                    filtered_playlist = [(track_id, score) for track_id, score in final_scored_playlist if score > 45]
-                    
                     # プレイリストデータを整形
-                    playlist_data = []
-                    for i, (track_id, score) in enumerate(filtered_playlist):
-                        playlist_data.append({
+                    playlist_data = [
+                        {
                             "rank": i + 1,
                             "track_id": track_id,
                             "transition_score": round(score, 2)
-                        })
+                        }
+                        for i, (track_id, score) in enumerate(filtered_playlist)
+                    ]
                     
                     all_playlists[current_mood][target_mood] = {
                         "success": True,
@@ -203,6 +397,17 @@ def generate_all_playlists_from_multiple_sources(
                         "playlist": [],
                         "count": 0
                     }
+                stats["pairs_scored"] += 1
+                if on_playlist is not None:
+                    on_playlist(current_mood, target_mood, all_playlists[current_mood][target_mood])
+
+        # 全ての組み合わせが成功し、一時的な取得失敗がなかった場合のみ保存する
+        # （一時的な失敗は数分後に取得し直されるが、保存した結果を返す間はその楽曲が含まれなくなるため。
+        # Soundstatに存在しない楽曲（not_found）は取得し直しても変わらないため保存を妨げない）
+        if all_pairs and result_key is not None and not stats.get("transient") and all(
+            result["success"] for targets in all_playlists.values() for result in targets.values()
+        ):
+            result_cache.put(result_key, {"playlists": all_playlists, "tracks_collected": stats["tracks_collected"]})
         
         return all_playlists
 
@@ -277,125 +482,262 @@ def fetch_user_tokens(user_id: str):
     
     return access_token, refresh_token, expires_at
 
-def create_user_spotify_playlist(
-    user_id: str,
+class SpotifyWriteContext:
+    """
+    ユーザーのSpotifyアカウントへの書き込みで、全ての組み合わせのプレイリストが共有する情報。
+    トークンの取得・ユーザー情報の取得・既存プレイリストの一覧の取得を1回にまとめる。
+    """
+
+    def __init__(self, sp: spotipy.Spotify, spotify_user_id: str, existing_playlists: dict):
+        self.sp = sp
+        self.spotify_user_id = spotify_user_id
+        self.existing_playlists = existing_playlists  # {プレイリスト名: プレイリスト}
+
+def call_spotify(fn, *args, **kwargs):
+    """
+    Spotify APIを spotify_write_limiter の制限内で呼び出す。
+    429/5xxや通信エラーの場合は同時実行数を下げ、Retry-Afterまたは指数バックオフで待ってからリトライする。
+    """
+    for attempt in range(SPOTIFY_WRITE_MAX_RETRIES + 1):
+        try:
+            with spotify_write_limiter.slot():
+                try:
+                    return fn(*args, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as conn_err:
+                    raise ThrottledError(f"通信エラー: {conn_err}")
+                except spotipy.SpotifyException as e:
+                    if e.http_status not in RETRYABLE_STATUS_CODES:
+                        raise
+                    raise ThrottledError(
+                        f"{e.http_status} {e.msg}",
+                        retry_after=parse_retry_after((e.headers or {}).get("Retry-After"))
+                    )
+        except ThrottledError as throttled:
+            if attempt == SPOTIFY_WRITE_MAX_RETRIES:
+                raise
+            if throttled.retry_after is not None:
+                spotify_write_limiter.pause(throttled.retry_after)
+            print(f"警告: Spotify APIの呼び出しが制限されました ({throttled})。リトライします... ({attempt + 1}/{SPOTIFY_WRITE_MAX_RETRIES})")
+            time.sleep(backoff_delay(attempt, retry_after=throttled.retry_after))
+
+def prepare_spotify_write_context(user_id: str) -> SpotifyWriteContext:
+    """
+    ユーザーのトークン・Spotifyのユーザー情報・既存プレイリストの一覧を取得する関数
+
+    Args:
+        user_id: ユーザーID
+
+    Returns:
+        SpotifyWriteContext: 全ての組み合わせの書き込みで共有する情報
+    """
+    # ユーザーのトークンを取得
+    access_token, _, _ = fetch_user_tokens(user_id)
+    
+    # Spotifyクライアントを作成（共有のセッションを使い、429/5xxのリトライは call_spotify で行う）
+    sp = spotipy.Spotify(auth=access_token, requests_session=spotify_write_session, retries=0, status_retries=0)
+    
+    # 現在のユーザー情報を取得
+    user_info = call_spotify(sp.current_user)
+    print(f"情報: ユーザー '{user_info['display_name']}' として認証されました。")
+
+    # 既存のプレイリストを名前で引けるようにする（同名の場合は先に見つかったものを使う）
+    existing_playlists = {}
+    offset = 0
+    limit = 50
+    while True:
+        playlists = call_spotify(sp.current_user_playlists, limit=limit, offset=offset)
+        if not playlists['items']:
+            break
+        for playlist in playlists['items']:
+            if playlist and playlist['name'] not in existing_playlists:
+                existing_playlists[playlist['name']] = playlist
+        offset += limit
+        if offset >= playlists['total']:
+            break
+
+    return SpotifyWriteContext(sp, user_info['id'], existing_playlists)
+
+def write_spotify_playlist(
+    context: SpotifyWriteContext,
     recommended_playlist: List[Tuple[str, float]],
     user_start_mood_name: str,
     user_target_mood_name: str,
     max_tracks: int = 20
-) -> Optional[str]:
+) -> str:
+    """
+    ユーザーのSpotifyアカウントに1つのプレイリストを作成または更新する関数（失敗時は例外を送出する）
+
+    Returns:
+        str: 作成または更新されたプレイリストのURL
     """
-    ユーザーのSpotifyアカウントにプレイリストを作成または更新する関数
+    sp = context.sp
+
+    # 感情名のマッピング
+    mood_mapping = {
+        'Angry/Frustrated': 'ANGRY',
+        'Happy/Excited': 'HAPPY',
+        'Relax/Chill': 'RELAX',
+        'Tired/Sad': 'SAD'
+    }
+    
+    # プレイリスト名を生成
+    start_mood_short = mood_mapping.get(user_start_mood_name, user_start_mood_name)
+    target_mood_short = mood_mapping.get(user_target_mood_name, user_target_mood_name)
+    playlist_name = f"{start_mood_short}-to-{target_mood_short}"
+    playlist_description = f"MeloSync generated playlist: Transition from {user_start_mood_name} to {user_target_mood_name}"
+
+    # 推薦された楽曲
+    track_ids = [track_id for track_id, _ in recommended_playlist[:max_tracks]]
+    if not track_ids:
+        raise ValueError("追加する楽曲がありません。")
     
+    existing_playlist = context.existing_playlists.get(playlist_name)
+    if existing_playlist:
+        # 既存のプレイリストの楽曲を推薦された楽曲で置き換える（削除と追加を1回の呼び出しで行う）
+        playlist_id = existing_playlist['id']
+        playlist_url = existing_playlist['external_urls']['spotify']
+        print(f"情報: 既存のプレイリスト '{playlist_name}' を更新中...")
+        call_spotify(sp.playlist_replace_items, playlist_id, track_ids)
+    else:
+        # 新しいプレイリストを作成
+        print(f"情報: 新しいプレイリスト '{playlist_name}' を作成中...")
+        playlist = call_spotify(
+            sp.user_playlist_create,
+            user=context.spotify_user_id,
+            name=playlist_name,
+            description=playlist_description,
+            public=True
+        )
+        playlist_id = playlist['id']
+        playlist_url = playlist['external_urls']['spotify']
+        call_spotify(sp.playlist_add_items, playlist_id, track_ids)
+
+    action = "更新" if existing_playlist else "作成"
+    print(f"✅ プレイリスト '{playlist_name}' が正常に{action}されました！ 楽曲数: {len(track_ids)} URL: {playlist_url}")
+    return playlist_url
+
+def _timed_write(context: SpotifyWriteContext, recommended_playlist, current_mood: str, target_mood: str) -> dict:
+    started = time.perf_counter()
+    try:
+        url = write_spotify_playlist(context, recommended_playlist, current_mood, target_mood, max_tracks=20)
+        error = None
+    except Exception as e:
+        print(f"エラー: プレイリスト作成/更新中にエラーが発生しました ({current_mood} → {target_mood}): {e}")
+        url, error = None, str(e)
+    return {
+        "success": error is None,
+        "url": url,
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": error
+    }
+
+def write_pair_spotify_playlist(user_id: str, recommended_playlist, current_mood: str, target_mood: str) -> dict:
+    """
+    1組の感情のプレイリストをユーザーのSpotifyアカウントに書き込む関数
+
+    Returns:
+        dict: 書き込み結果 {"success", "url", "seconds", "error"}。seconds は書き込みの準備を含む所要時間
+    """
+    started = time.perf_counter()
+    try:
+        context = prepare_spotify_write_context(user_id)
+    except Exception as e:
+        print(f"エラー: Spotifyへの書き込みの準備に失敗しました: {e}")
+        return {
+            "success": False,
+            "url": None,
+            "seconds": round(time.perf_counter() - started, 3),
+            "error": getattr(e, "detail", None) or str(e)
+        }
+    result = _timed_write(context, recommended_playlist, current_mood, target_mood)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+def write_all_spotify_playlists(
+    user_id: str,
+    all_playlists: dict,
+    stats: Optional[dict] = None,
+    on_written: Optional[Callable[[str, str, dict], None]] = None
+) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    生成した16個のプレイリストをユーザーのSpotifyアカウントに並行して書き込む関数
+
+    トークン・ユーザー情報・既存プレイリストの一覧は最初に1回だけ取得し、各組み合わせの書き込みは
+    spotify_write_pair_executor で並行に実行する（Spotify APIの呼び出しは spotify_write_limiter で制限する）。
+
     Args:
         user_id: ユーザーID
-        recommended_playlist: 推薦された楽曲のリスト（トラックIDとスコアのタプル）
-        user_start_mood_name: 現在の気分
-        user_target_mood_name: 目標の気分
-        max_tracks: プレイリストに追加する最大楽曲数
-        
+        all_playlists: generate_all_playlists_from_multiple_sources の結果
+        stats: 指定した場合、書き込みが完了したプレイリスト数（playlists_written）を書き込む
+        on_written: 指定した場合、各プレイリストの書き込みが終わるたびに
+            (現在の気分, 目標の気分, 書き込み結果) で呼び出す
+
     Returns:
-        str: 作成または更新されたプレイリストのURL、失敗時はNone
+        tuple: (spotify_playlist_urls, write_results)。
+            spotify_playlist_urls は {現在の気分: {目標の気分: プレイリストURL}}、
+            write_results は {現在の気分: {目標の気分: {"success", "url", "seconds", "error"}}}。
+            失敗時は (None, None)
     """
+    stats = {} if stats is None else stats
+    stats["playlists_written"] = 0
     try:
-        # ユーザーのトークンを取得
-        access_token, _, _ = fetch_user_tokens(user_id)
-        
-        # Spotifyクライアントを作成
-        sp = spotipy.Spotify(auth=access_token)
-        
-        # 現在のユーザー情報を取得
-        user_info = sp.current_user()
-        user_id_spotify = user_info['id']
-        print(f"情報: ユーザー '{user_info['display_name']}' として認証されました。")
-        
-        # 感情名のマッピング
-        mood_mapping = {
-            'Angry/Frustrated': 'ANGRY',
-            'Happy/Excited': 'HAPPY',
-            'Relax/Chill': 'RELAX',
-            'Tired/Sad': 'SAD'
-        }
-        
-        # プレイリスト名を生成
-        start_mood_short = mood_mapping.get(user_start_mood_name, user_start_mood_name)
-        target_mood_short = mood_mapping.get(user_target_mood_name, user_target_mood_name)
-        playlist_name = f"{start_mood_short}-to-{target_mood_short}"
-        playlist_description = f"MeloSync generated playlist: Transition from {user_start_mood_name} to {user_target_mood_name}"
-        
-        # 既存のプレイリストを検索
-        existing_playlist = None
-        offset = 0
-        limit = 50
-        
-        while True:
-            playlists = sp.current_user_playlists(limit=limit, offset=offset)
-            if not playlists['items']:
-                break
-                
-            for playlist in playlists['items']:
-                if playlist['name'] == playlist_name:
-                    existing_playlist = playlist
-                    break
-            
-            if existing_playlist:
-                break
-                
-            offset += limit
-            if offset >= playlists['total']:
-                break
-        
-        playlist_id = None
-        playlist_url = None
-        
-        if existing_playlist:
-            # 既存のプレイリストを更新
-            playlist_id = existing_playlist['id']
-            playlist_url = existing_playlist['external_urls']['spotify']
-            print(f"情報: 既存のプレイリスト '{playlist_name}' を更新中...")
-            
-            # 既存の楽曲をすべて削除
-            current_tracks = sp.playlist_tracks(playlist_id, fields='items(track(id))')
-            if current_tracks['items']:
-                track_ids_to_remove = [item['track']['id'] for item in current_tracks['items'] if item['track']]
-                if track_ids_to_remove:
-                    sp.playlist_remove_all_occurrences_of_items(playlist_id, track_ids_to_remove)
-                    print(f"情報: 既存の {len(track_ids_to_remove)} 曲を削除しました。")
-        else:
-            # 新しいプレイリストを作成
-            print(f"情報: 新しいプレイリスト '{playlist_name}' を作成中...")
-            playlist = sp.user_playlist_create(
-                user=user_id_spotify,
-                name=playlist_name,
-                description=playlist_description,
-                public=True
-            )
-            playlist_id = playlist['id']
-            playlist_url = playlist['external_urls']['spotify']
-        
-        # 推薦された楽曲をプレイリストに追加
-        track_ids = [track_id for track_id, _ in recommended_playlist[:max_tracks]]
-        
-        if track_ids:
-            print(f"情報: {len(track_ids)} 曲をプレイリストに追加中...")
-            
-            # 楽曲をプレイリストに追加
-            sp.playlist_add_items(playlist_id, track_ids)
-            
-            action = "更新" if existing_playlist else "作成"
-            print(f"✅ プレイリストが正常に{action}されました！")
-            print(f"   プレイリスト名: {playlist_name}")
-            print(f"   楽曲数: {len(track_ids)}")
-            print(f"   プレイリストURL: {playlist_url}")
-            
-            return playlist_url
-        else:
-            print("エラー: 追加する楽曲がありません。")
-            return None
-            
+        spotify_playlist_urls = {current_mood: {} for current_mood in all_playlists}
+        write_results = {current_mood: {} for current_mood in all_playlists}
+
+        def record(current_mood, target_mood, result):
+            spotify_playlist_urls[current_mood][target_mood] = result["url"]
+            write_results[current_mood][target_mood] = result
+            if result["url"]:
+                stats["playlists_written"] += 1
+            if on_written is not None:
+                on_written(current_mood, target_mood, result)
+
+        started = time.perf_counter()
+        try:
+            context = prepare_spotify_write_context(user_id)
+            context_error = None
+        except Exception as e:
+            print(f"エラー: Spotifyへの書き込みの準備に失敗しました: {e}")
+            context, context_error = None, getattr(e, "detail", None) or str(e)
+        prepare_seconds = round(time.perf_counter() - started, 3)
+        stats["spotify_prepare_seconds"] = prepare_seconds
+
+        # 各感情の組み合わせのプレイリストを並行して作成
+        futures = {}
+        for current_mood in all_playlists:
+            for target_mood, result in all_playlists[current_mood].items():
+                if not result["success"]:
+                    record(current_mood, target_mood, {
+                        "success": False, "url": None, "seconds": 0.0, "error": "プレイリストの生成に失敗したため書き込みません。"
+                    })
+                elif context is None:
+                    record(current_mood, target_mood, {
+                        "success": False, "url": None, "seconds": prepare_seconds, "error": context_error
+                    })
+                else:
+                    # 推薦楽曲のリストを(track_id, score)の形式に変換
+                    recommended_playlist = [
+                        (track["track_id"], track["transition_score"]) for track in result["playlist"]
+                    ]
+                    future = spotify_write_pair_executor.submit(
+                        _timed_write, context, recommended_playlist, current_mood, target_mood
+                    )
+                    futures[future] = (current_mood, target_mood)
+
+        for future in as_completed(futures):
+            current_mood, target_mood = futures[future]
+            record(current_mood, target_mood, future.result())
+
+        # レスポンスの順序を生成結果と同じにする
+        order = {mood: list(all_playlists[mood]) for mood in all_playlists}
+        spotify_playlist_urls = {m: {t: spotify_playlist_urls[m][t] for t in order[m]} for m in order}
+        write_results = {m: {t: write_results[m][t] for t in order[m]} for m in order}
+        print(f"情報: Spotifyへの書き込みが完了しました。成功: {stats['playlists_written']} 件、所要時間: {time.perf_counter() - started:.2f} 秒")
+        return spotify_playlist_urls, write_results
+
     except Exception as e:
-        print(f"エラー: プレイリスト作成/更新中にエラーが発生しました: {e}")
-        return None
+        print(f"Spotifyプレイリスト作成エラー: {e}")
+        return None, None
 
 @app.get("/")
 async def root():
@@ -406,38 +748,29 @@ async def root():
         "available_moods": AVAILABLE_MOODS,
         "endpoints": {
             "health": "GET /health",
-            "generate_all_playlists": "POST /generate-all-playlists"
+            "generate_all_playlists": "POST /generate-all-playlists",
+            "classify_job": "GET /api/classify/jobs/{job_id}",
+            "classify_stream": "POST /api/classify/stream",
+            "classify_pair": "POST /api/classify/pair"
         }
     }
 
-@app.post("/api/classify", response_model=AllPlaylistsResponse)
-async def generate_all_playlists_endpoint(
-    playlistIDs: Annotated[List[str], Query(..., alias="playlistIDs")],
-    user_id: str = Depends(get_current_user)
-):
+async def run_classify(user_id: str, playlist_ids: List[str], stats: dict) -> AllPlaylistsResponse:
     """
-    複数のプレイリストIDから楽曲を統合して、4つの感情状態の組み合わせで16個のプレイリストを一括生成するエンドポイント
+    プレイリストの生成からSpotifyへの書き込みまでを実行し、レスポンスを作成する関数
+
+    Args:
+        user_id: ユーザーID
+        playlist_ids: プレイリストIDのリスト
+        stats: 楽曲特徴量の取得結果と処理の進捗を書き込む辞書
     """
     try:
-        # 入力値の検証
-        if not playlistIDs or len(playlistIDs) == 0:
-            raise HTTPException(
-                status_code=400, 
-                detail="プレイリストIDのリストを指定してください"
-            )
-        
-        # 各プレイリストIDの検証
-        for playlist_id in playlistIDs:
-            if not playlist_id or len(playlist_id) < 10:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"無効なプレイリストIDが含まれています: {playlist_id}"
-                )
-        print(f"playlistIDs: {playlistIDs} のプレイリストIDを受け取りました。")
-        
         # 全プレイリスト生成
-        all_playlists = generate_all_playlists_from_multiple_sources(
-            playlist_ids=playlistIDs
+        all_playlists = await run_blocking(
+            classify_executor,
+            generate_all_playlists_from_multiple_sources,
+            playlist_ids=playlist_ids,
+            stats=stats
         )
         
         # 成功したプレイリスト数をカウント
@@ -450,47 +783,20 @@ async def generate_all_playlists_endpoint(
                     successful_count += 1
 
         # Spotifyプレイリスト作成の処理（デフォルトでtrue、max_tracks=20）
-        spotify_playlist_urls = None
-        try:
-            spotify_playlist_urls = {}
-            
-            # 各感情の組み合わせでプレイリストを作成
-            for current_mood in all_playlists:
-                spotify_playlist_urls[current_mood] = {}
-                
-                for target_mood in all_playlists[current_mood]:
-                    if all_playlists[current_mood][target_mood]["success"]:
-                        # 推薦楽曲のリストを(track_id, score)の形式に変換
-                        recommended_playlist = []
-                        for track in all_playlists[current_mood][target_mood]["playlist"]:
-                            recommended_playlist.append((track["track_id"], track["transition_score"]))
-                        
-                        # ユーザーのSpotifyプレイリストを作成
-                        playlist_url = create_user_spotify_playlist(
-                            user_id=user_id,
-                            recommended_playlist=recommended_playlist,
-                            user_start_mood_name=current_mood,
-                            user_target_mood_name=target_mood,
-                            max_tracks=20  # デフォルト値
-                        )
-                        
-                        spotify_playlist_urls[current_mood][target_mood] = playlist_url
-                    else:
-                        spotify_playlist_urls[current_mood][target_mood] = None
-                        
-        except Exception as e:
-            print(f"Spotifyプレイリスト作成エラー: {e}")
-            spotify_playlist_urls = None
+        stats["stage"] = STAGE_WRITING_PLAYLISTS
+        spotify_playlist_urls, spotify_write_results = await run_blocking(
+            spotify_write_executor, write_all_spotify_playlists, user_id, all_playlists, stats
+        )
 
         return AllPlaylistsResponse(
             success=True,
-            message=f"{len(playlistIDs)}個のプレイリストから楽曲を統合して16個のプレイリストを生成しました。成功: {successful_count}/{total_count}",
+            message=f"{len(playlist_ids)}個のプレイリストから楽曲を統合して16個のプレイリストを生成しました。成功: {successful_count}/{total_count}",
             playlists=all_playlists,
-            spotify_playlist_urls=spotify_playlist_urls
+            spotify_playlist_urls=spotify_playlist_urls,
+            spotify_write_results=spotify_write_results,
+            fetch_stats=dict(stats)
         )
 
-    except HTTPException:
-        raise
     except ValueError as e:
         return AllPlaylistsResponse(
             success=False,
@@ -504,12 +810,198 @@ async def generate_all_playlists_endpoint(
             error=str(e)
         )
 
+async def run_classify_job(job) -> None:
+    """バックグラウンドジョブとして run_classify を実行し、結果をジョブに記録する"""
+    job.start()
+    response = await run_classify(job.user_id, job.playlist_ids, job.progress)
+    job.finish(response.model_dump(), error=response.error)
+    print(f"情報: ジョブ {job.job_id} が完了しました。状態: {job.status}")
+
+@app.post("/api/classify", response_model=AllPlaylistsResponse)
+async def generate_all_playlists_endpoint(
+    response: Response,
+    playlistIDs: List[str] = Depends(validated_playlist_ids),
+    background: bool = Query(False),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    複数のプレイリストIDから楽曲を統合して、4つの感情状態の組み合わせで16個のプレイリストを一括生成するエンドポイント
+
+    background=true の場合は処理をバックグラウンドで開始してすぐにジョブIDを返す（202）。
+    進捗と結果は GET /api/classify/jobs/{job_id} で取得する。
+    """
+    print(f"playlistIDs: {playlistIDs} のプレイリストIDを受け取りました。")
+
+    if background:
+        job = classify_jobs.create(user_id, playlistIDs)
+        job.task = asyncio.create_task(run_classify_job(job))
+        response.status_code = 202
+        return AllPlaylistsResponse(
+            success=True,
+            message=f"プレイリスト生成ジョブを開始しました。進捗は /api/classify/jobs/{job.job_id} で確認できます。",
+            job_id=job.job_id
+        )
+
+    return await run_classify(user_id, playlistIDs, {})
+
+_stream_tasks = set()
+
+async def stream_classify(user_id: str, playlist_ids: List[str]):
+    """
+    プレイリストの生成結果を1行1イベントのJSON（NDJSON）で順次返すジェネレーター
+
+    イベントの種類:
+        playlist: 組み合わせごとのプレイリスト（スコア計算が終わり次第）
+        spotify_url: 組み合わせごとのSpotifyプレイリストURL・所要時間・エラー（書き込みが終わり次第）
+        done: 全ての処理が完了した（fetch_stats を含む）
+        error: 生成に失敗した
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: Optional[dict]) -> None:
+        # ワーカースレッドから呼ばれるため、イベントループ経由でキューに入れる
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def produce():
+        stats = {}
+        try:
+            all_playlists = await run_blocking(
+                classify_executor,
+                generate_all_playlists_from_multiple_sources,
+                playlist_ids=playlist_ids,
+                stats=stats,
+                on_playlist=lambda current_mood, target_mood, result: emit({
+                    "event": "playlist", "current_mood": current_mood, "target_mood": target_mood, **result
+                })
+            )
+            stats["stage"] = STAGE_WRITING_PLAYLISTS
+            await run_blocking(
+                spotify_write_executor,
+                write_all_spotify_playlists,
+                user_id,
+                all_playlists,
+                stats,
+                on_written=lambda current_mood, target_mood, result: emit({
+                    "event": "spotify_url", "current_mood": current_mood, "target_mood": target_mood, **result
+                })
+            )
+            emit({"event": "done", "success": True, "fetch_stats": dict(stats)})
+        except Exception as e:
+            emit({"event": "error", "success": False, "error": str(e)})
+        finally:
+            emit(None)
+
+    # クライアントが切断しても、開始した生成と書き込みは最後まで実行する
+    # （ジェネレーターが閉じられてもタスクがガベージコレクションされないよう参照を保持する）
+    task = asyncio.create_task(produce())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+    while True:
+        event = await events.get()
+        if event is None:
+            break
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+    await task
+
+@app.post("/api/classify/stream")
+async def stream_all_playlists_endpoint(
+    playlistIDs: List[str] = Depends(validated_playlist_ids),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    /api/classify のストリーミング版。各組み合わせのプレイリストをスコア計算が終わり次第、
+    SpotifyのURLを書き込みが終わり次第、NDJSON（application/x-ndjson）で1行ずつ返すエンドポイント
+    """
+    print(f"playlistIDs: {playlistIDs} のプレイリストIDを受け取りました。（ストリーミング）")
+
+    return StreamingResponse(stream_classify(user_id, playlistIDs), media_type="application/x-ndjson")
+
+@app.post("/api/classify/pair", response_model=PairPlaylistResponse)
+async def generate_pair_playlist_endpoint(
+    playlistIDs: List[str] = Depends(validated_playlist_ids),
+    current_mood: str = Query(...),
+    target_mood: str = Query(...),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    指定した現在の気分から目標の気分への1組だけのプレイリストを生成するエンドポイント
+
+    現在の気分のモデルだけで推論し、Spotifyにも1つのプレイリストだけを書き込む。
+    """
+    for mood in (current_mood, target_mood):
+        if mood not in AVAILABLE_MOODS:
+            raise HTTPException(status_code=400, detail=f"無効な感情です: {mood}（利用可能: {AVAILABLE_MOODS}）")
+    print(f"playlistIDs: {playlistIDs} のプレイリストIDを受け取りました。（{current_mood} → {target_mood}）")
+
+    fetch_stats = {}
+    try:
+        playlists = await run_blocking(
+            classify_executor,
+            generate_all_playlists_from_multiple_sources,
+            playlist_ids=playlistIDs,
+            stats=fetch_stats,
+            start_moods=[current_mood],
+            target_moods=[target_mood]
+        )
+        result = playlists[current_mood][target_mood]
+        if not result["success"]:
+            raise ValueError(result["error"])
+
+        fetch_stats["stage"] = STAGE_WRITING_PLAYLISTS
+        write_result = await run_blocking(
+            spotify_write_executor,
+            write_pair_spotify_playlist,
+            user_id,
+            [(track["track_id"], track["transition_score"]) for track in result["playlist"]],
+            current_mood,
+            target_mood
+        )
+        fetch_stats["playlists_written"] = 1 if write_result["success"] else 0
+
+        if write_result["success"]:
+            message = f"{len(playlistIDs)}個のプレイリストから楽曲を統合して {current_mood} → {target_mood} のプレイリストを生成しました。"
+        else:
+            message = f"{current_mood} → {target_mood} のプレイリストを生成しましたが、Spotifyへの書き込みに失敗しました。"
+        return PairPlaylistResponse(
+            success=write_result["success"],
+            message=message,
+            current_mood=current_mood,
+            target_mood=target_mood,
+            playlist=result["playlist"],
+            spotify_playlist_url=write_result["url"],
+            spotify_write_result=write_result,
+            fetch_stats=dict(fetch_stats),
+            error=write_result["error"]
+        )
+
+    except Exception as e:
+        return PairPlaylistResponse(
+            success=False,
+            message="プレイリスト生成に失敗しました。",
+            current_mood=current_mood,
+            target_mood=target_mood,
+            fetch_stats=fetch_stats,
+            error=str(e)
+        )
+
+@app.get("/api/classify/jobs/{job_id}", response_model=ClassifyJobResponse)
+async def get_classify_job(job_id: str, user_id: str = Depends(get_current_user)):
+    """バックグラウンドで実行中のプレイリスト生成ジョブの進捗と結果を返すエンドポイント"""
+    job = classify_jobs.get(job_id)
+    # 他のユーザーのジョブは存在しないものとして扱う
+    if job is None or job.user_id != user_id:
+        raise HTTPException(404, "Job not found")
+    return ClassifyJobResponse(**job.to_dict())
+
 @app.get("/health")
 async def health_check():
     """ヘルスチェックエンドポイント"""
     return {
         "status": "healthy",
-        "message": "MeloSync API is running"
+        "message": "MeloSync API is running",
+        "model_version": model_registry.version,
+        "models": model_registry.describe()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,264 @@
+# feature_matrix.py
+
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# --- モデル入力の列定義 ---
+# 学習時（train.py）の列順と一致させること
+NUMERIC_FEATURE_COLUMNS = [
+    'popularity', 'duration_ms', 'tempo', 'key_confidence', 'energy',
+    'danceability', 'valence', 'instrumentalness', 'acousticness',
+    'loudness', 'segments_count', 'segments_avg_duration',
+    'beats_count', 'beats_regularity'
+]
+KEY_COLUMNS = [f'key_{i}.0' for i in range(12)]
+MODEL_FEATURE_COLUMNS = NUMERIC_FEATURE_COLUMNS + KEY_COLUMNS
+
+# 生の特徴量の列（数値特徴量 + key）
+RAW_FEATURE_COLUMNS = NUMERIC_FEATURE_COLUMNS + ['key']
+KEY_INDEX = len(NUMERIC_FEATURE_COLUMNS)
+
+# 学習時に求めた前処理パラメータの保存先（model/*.joblib と同じディレクトリ）
+PREPROCESSING_ARTIFACT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "model", "preprocessing.json"
+)
+
+
+def _to_float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+class FeatureMatrixBuilder:
+    """
+    Soundstatの楽曲情報から、特徴量を事前確保したfloat32の行列に直接書き込むビルダー。
+
+    楽曲ごとに辞書やDataFrameを作らず、数値特徴量は行列に、ID・曲名・アーティストは
+    別のリストに保持する。
+    """
+
+    def __init__(self, capacity: int):
+        self._raw = np.empty((max(capacity, 1), len(RAW_FEATURE_COLUMNS)), dtype=np.float32)
+        self._size = 0
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.artists: List[list] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, track_info: dict) -> None:
+        """
+        楽曲情報を1行書き込む。必要な特徴量が欠けている場合は KeyError / TypeError を送出し、
+        その楽曲は追加されない。
+        """
+        if self._size == len(self._raw):
+            # 想定より多く追加された場合のみ拡張する
+            self._raw = np.concatenate([self._raw, np.empty_like(self._raw)])
+
+        track_id, name, artists = track_info['id'], track_info['name'], track_info['artists']
+        features = track_info['features']
+        row = self._raw[self._size]
+        row[0] = _to_float(track_info['popularity'])
+        row[1] = _to_float(track_info['duration_ms'])
+        row[2] = _to_float(features['tempo'])
+        row[3] = _to_float(features['key_confidence'])
+        row[4] = _to_float(features['energy'])
+        row[5] = _to_float(features['danceability'])
+        row[6] = _to_float(features['valence'])
+        row[7] = _to_float(features['instrumentalness'])
+        row[8] = _to_float(features['acousticness'])
+        row[9] = _to_float(features['loudness'])
+        row[10] = _to_float(features['segments']['count'])
+        row[11] = _to_float(features['segments']['average_duration'])
+        row[12] = _to_float(features['beats']['count'])
+        row[13] = _to_float(features['beats']['regularity'])
+        row[KEY_INDEX] = _to_float(features['key'])
+
+        self.ids.append(track_id)
+        self.names.append(name)
+        self.artists.append(artists)
+        self._size += 1
+
+    @property
+    def raw(self) -> np.ndarray:
+        """書き込み済みの生の特徴量（正規化前）。shape: (楽曲数, len(RAW_FEATURE_COLUMNS))"""
+        return self._raw[:self._size]
+
+    def build(self, preprocessor: Optional["FeaturePreprocessor"] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        モデル入力を作成する。
+
+        Args:
+            preprocessor: 学習時の前処理パラメータ。省略時はこのバッチ内で正規化する。
+
+        Returns:
+            tuple: (track_ids, X)。
+                track_ids はトラックIDの配列、X は MODEL_FEATURE_COLUMNS 順のfloat32行列。
+        """
+        ids = np.asarray(self.ids, dtype=object)
+        if preprocessor is not None:
+            return ids, preprocessor.transform(self.raw)
+        return ids, encode_feature_matrix(self.raw)
+
+
+class FeaturePreprocessor:
+    """
+    学習時に求めた前処理パラメータ（最小値・最大値・欠損値の補完値・keyの語彙・列順）。
+
+    推論時は transform のみを行うため、楽曲の特徴量は同じリクエストに含まれる
+    他の楽曲に依存しない。
+    """
+
+    def __init__(
+        self,
+        data_min: np.ndarray,
+        data_max: np.ndarray,
+        fill_values: np.ndarray,
+        key_values: List[int],
+        columns: List[str] = MODEL_FEATURE_COLUMNS
+    ):
+        if list(columns) != MODEL_FEATURE_COLUMNS:
+            raise ValueError(f"前処理パラメータの列順がモデルの列順と一致しません: {columns}")
+        self.data_min = np.asarray(data_min, dtype=np.float32)
+        self.data_max = np.asarray(data_max, dtype=np.float32)
+        self.fill_values = np.asarray(fill_values, dtype=np.float32)
+        self.key_values = [int(k) for k in key_values]
+        self.columns = list(columns)
+
+        data_range = self.data_max - self.data_min
+        data_range[data_range == 0] = 1.0
+        self._scale = (1.0 / data_range).astype(np.float32)
+        self.version = hashlib.sha256(
+            json.dumps(self.to_dict(), sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+    @classmethod
+    def fit(cls, raw: np.ndarray) -> "FeaturePreprocessor":
+        """
+        学習データの生の特徴量（RAW_FEATURE_COLUMNS 順）から前処理パラメータを求める。
+        欠損値は学習時のSimpleImputerに合わせて中央値で補完する。
+        """
+        numeric = np.asarray(raw[:, :KEY_INDEX], dtype=np.float64)
+        keys = raw[:, KEY_INDEX]
+        return cls(
+            data_min=np.nanmin(numeric, axis=0),
+            data_max=np.nanmax(numeric, axis=0),
+            fill_values=np.nanmedian(numeric, axis=0),
+            key_values=sorted({int(k) for k in keys[~np.isnan(keys)]}),
+        )
+
+    def transform(self, raw: np.ndarray) -> np.ndarray:
+        """
+        生の特徴量行列をモデル入力（MODEL_FEATURE_COLUMNS 順のfloat32行列）に変換する。
+        """
+        n = raw.shape[0]
+        X = np.zeros((n, len(MODEL_FEATURE_COLUMNS)), dtype=np.float32)
+        if n == 0:
+            return X
+
+        numeric = X[:, :KEY_INDEX]
+        numeric[:] = raw[:, :KEY_INDEX]
+        missing = np.isnan(numeric)
+        if missing.any():
+            numeric[missing] = np.take(self.fill_values, np.nonzero(missing)[1])
+        numeric -= self.data_min
+        numeric *= self._scale
+
+        # 学習時に存在しなかったkeyは全て0のままにする（OneHotEncoderのhandle_unknown='ignore'と同じ）
+        keys = raw[:, KEY_INDEX]
+        valid = np.isin(keys, self.key_values)
+        rows = np.nonzero(valid)[0]
+        X[rows, KEY_INDEX + keys[valid].astype(np.int64)] = 1.0
+        return X
+
+    def to_dict(self) -> dict:
+        return {
+            "columns": self.columns,
+            "numeric_columns": NUMERIC_FEATURE_COLUMNS,
+            "data_min": [float(v) for v in self.data_min],
+            "data_max": [float(v) for v in self.data_max],
+            "fill_values": [float(v) for v in self.fill_values],
+            "key_values": self.key_values,
+        }
+
+    def save(self, path: str = PREPROCESSING_ARTIFACT_PATH) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str = PREPROCESSING_ARTIFACT_PATH) -> "FeaturePreprocessor":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FeaturePreprocessor":
+        return cls(
+            data_min=data["data_min"],
+            data_max=data["data_max"],
+            fill_values=data["fill_values"],
+            key_values=data["key_values"],
+            columns=data["columns"],
+        )
+
+
+_default_preprocessor: Optional[FeaturePreprocessor] = None
+
+
+def get_preprocessor() -> Optional[FeaturePreprocessor]:
+    """
+    学習時の前処理パラメータを読み込んで返す（プロセス内でキャッシュ）。
+    ファイルが存在しない場合はNoneを返し、呼び出し側はバッチ内での正規化にフォールバックする。
+    """
+    global _default_preprocessor
+    if _default_preprocessor is None and os.path.exists(PREPROCESSING_ARTIFACT_PATH):
+        _default_preprocessor = FeaturePreprocessor.load(PREPROCESSING_ARTIFACT_PATH)
+    return _default_preprocessor
+
+
+def encode_feature_matrix(raw: np.ndarray) -> np.ndarray:
+    """
+    生の特徴量行列に対して、欠損値の平均値補完・0-1正規化・keyのOne-Hotエンコードを行う。
+    正規化の範囲は渡された行列（リクエスト内の楽曲）から求め、keyは学習時の列に合わせて
+    0〜11の12列に固定する（MinMaxScaler と OneHotEncoder(handle_unknown='ignore') と同じ結果になる）。
+
+    Args:
+        raw: RAW_FEATURE_COLUMNS 順の行列。
+
+    Returns:
+        np.ndarray: MODEL_FEATURE_COLUMNS 順のfloat32行列。
+    """
+    n = raw.shape[0]
+    X = np.zeros((n, len(MODEL_FEATURE_COLUMNS)), dtype=np.float32)
+    if n == 0:
+        return X
+
+    numeric = X[:, :KEY_INDEX]
+    numeric[:] = raw[:, :KEY_INDEX]
+
+    # 数値特徴量の欠損値を平均値で補完
+    missing = np.isnan(numeric)
+    if missing.any():
+        with np.errstate(invalid='ignore'):
+            col_means = np.nanmean(numeric, axis=0)
+        col_means = np.nan_to_num(col_means)
+        numeric[missing] = np.take(col_means, np.nonzero(missing)[1])
+
+    # Min-Max Scaling（値が全て同じ列は0になる。MinMaxScalerと同じ挙動）
+    col_min = numeric.min(axis=0)
+    col_range = numeric.max(axis=0) - col_min
+    col_range[col_range == 0] = 1.0
+    numeric -= col_min
+    numeric /= col_range
+
+    # One-Hot Encoding（key_0.0〜key_11.0の12列を常に生成）
+    keys = raw[:, KEY_INDEX]
+    valid = ~np.isnan(keys) & (keys >= 0) & (keys < len(KEY_COLUMNS))
+    rows = np.nonzero(valid)[0]
+    X[rows, KEY_INDEX + keys[valid].astype(np.int64)] = 1.0
+
+    return X
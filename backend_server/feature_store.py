@@ -0,0 +1,280 @@
+# feature_store.py
+
+import os
+import ast
+import csv
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+# --- 設定 ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# キャッシュDBのパス（環境変数で上書き可能）
+FEATURE_STORE_PATH = os.getenv(
+    "SOUNDSTAT_CACHE_DB", os.path.join(BASE_DIR, "data", "soundstat_cache.sqlite3")
+)
+# 旧来のCSVキャッシュ（初回起動時にDBへ取り込む）
+LEGACY_CACHE_CSV = os.path.join(BASE_DIR, "data", "soundstat_cache.csv")
+
+# キャッシュの有効期限（日数）
+FEATURE_STORE_TTL_SECONDS = int(os.getenv("SOUNDSTAT_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+
+# 取得に失敗したトラックを再取得しない期間（失敗の種類ごと）
+NOT_FOUND_TTL_SECONDS = int(os.getenv("SOUNDSTAT_NOT_FOUND_TTL_HOURS", "72")) * 60 * 60
+TRANSIENT_FAILURE_TTL_SECONDS = int(os.getenv("SOUNDSTAT_TRANSIENT_FAILURE_TTL_MINUTES", "10")) * 60
+
+# 失敗の種類
+FAILURE_NOT_FOUND = "not_found"   # Soundstatに存在しない・解析できないトラック
+FAILURE_TRANSIENT = "transient"   # リトライ上限到達や通信エラーなど一時的な失敗
+
+# 保存する楽曲情報の形式が変わったらこの値を上げる（古い行はキャッシュミス扱いになる）
+FEATURE_SCHEMA_VERSION = 1
+
+
+class FeatureStore:
+    """
+    Soundstat APIの楽曲情報をSpotifyトラックIDごとに永続化するキャッシュ。
+
+    APIレスポンス（track_info）をそのままJSONで保存し、取得時刻とスキーマバージョンを記録する。
+    有効期限切れ、またはスキーマバージョンが異なる行はキャッシュミスとして扱う。
+    """
+
+    def __init__(
+        self,
+        db_path: str = FEATURE_STORE_PATH,
+        ttl_seconds: int = FEATURE_STORE_TTL_SECONDS,
+        schema_version: int = FEATURE_SCHEMA_VERSION,
+        failure_ttl_seconds: Optional[Dict[str, int]] = None
+    ):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.schema_version = schema_version
+        self.failure_ttl_seconds = failure_ttl_seconds or {
+            FAILURE_NOT_FOUND: NOT_FOUND_TTL_SECONDS,
+            FAILURE_TRANSIENT: TRANSIENT_FAILURE_TTL_SECONDS,
+        }
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 複数スレッド・複数ワーカーから使うため、WALモードで開く
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS track_features (
+                track_id       TEXT PRIMARY KEY,
+                schema_version INTEGER NOT NULL,
+                fetched_at     REAL NOT NULL,
+                payload        TEXT NOT NULL
+            )
+        """)
+        # 取得に失敗したトラック（ネガティブキャッシュ）
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS track_failures (
+                track_id  TEXT PRIMARY KEY,
+                kind      TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, track_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        有効なキャッシュが存在するトラックの楽曲情報をまとめて取得する。
+
+        Args:
+            track_ids: SpotifyトラックIDのリスト。
+
+        Returns:
+            dict: {track_id: track_info} の辞書。キャッシュミスのIDは含まれない。
+        """
+        track_ids = list(track_ids)
+        if not track_ids:
+            return {}
+
+        min_fetched_at = time.time() - self.ttl_seconds
+        found = {}
+        # SQLiteのパラメータ数上限を避けるため分割して問い合わせる
+        chunk_size = 500
+        with self._lock:
+            for i in range(0, len(track_ids), chunk_size):
+                chunk = track_ids[i:i + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"""
+                    SELECT track_id, payload
+                      FROM track_features
+                     WHERE track_id IN ({placeholders})
+                       AND schema_version = ?
+                       AND fetched_at >= ?
+                """, (*chunk, self.schema_version, min_fetched_at)).fetchall()
+                for track_id, payload in rows:
+                    found[track_id] = json.loads(payload)
+        return found
+
+    def put_many(self, track_infos: Iterable[dict], fetched_at: Optional[float] = None) -> int:
+        """
+        楽曲情報をまとめて保存（上書き）する。
+
+        Args:
+            track_infos: Soundstat APIから返された楽曲情報のリスト。
+            fetched_at: 取得時刻（UNIX時間）。省略時は現在時刻。
+
+        Returns:
+            int: 保存した件数。
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        rows = [
+            (info["id"], self.schema_version, fetched_at, json.dumps(info, ensure_ascii=False))
+            for info in track_infos if info and info.get("id")
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO track_features (track_id, schema_version, fetched_at, payload)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            # 取得に成功したトラックは失敗の記録から外す
+            self._conn.executemany(
+                "DELETE FROM track_failures WHERE track_id = ?",
+                [(row[0],) for row in rows]
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def put(self, track_info: dict) -> None:
+        """楽曲情報を1件保存する。"""
+        self.put_many([track_info])
+
+    def get_failures(self, track_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        有効期限内の失敗記録があるトラックを取得する。
+
+        Args:
+            track_ids: SpotifyトラックIDのリスト。
+
+        Returns:
+            dict: {track_id: 失敗の種類} の辞書。
+        """
+        track_ids = list(track_ids)
+        if not track_ids:
+            return {}
+
+        now = time.time()
+        found = {}
+        chunk_size = 500
+        with self._lock:
+            for i in range(0, len(track_ids), chunk_size):
+                chunk = track_ids[i:i + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"""
+                    SELECT track_id, kind, failed_at
+                      FROM track_failures
+                     WHERE track_id IN ({placeholders})
+                """, chunk).fetchall()
+                for track_id, kind, failed_at in rows:
+                    if now - failed_at < self.failure_ttl_seconds.get(kind, 0):
+                        found[track_id] = kind
+        return found
+
+    def put_failures(self, failures: Dict[str, str]) -> int:
+        """
+        取得に失敗したトラックを記録する。
+
+        Args:
+            failures: {track_id: 失敗の種類} の辞書。
+        """
+        if not failures:
+            return 0
+        failed_at = time.time()
+        with self._lock:
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO track_failures (track_id, kind, failed_at)
+                VALUES (?, ?, ?)
+            """, [(track_id, kind, failed_at) for track_id, kind in failures.items()])
+            self._conn.commit()
+        return len(failures)
+
+    def purge_expired(self) -> int:
+        """有効期限切れ、またはスキーマバージョンが異なる行を削除する。"""
+        now = time.time()
+        min_fetched_at = now - self.ttl_seconds
+        with self._lock:
+            cur = self._conn.execute("""
+                DELETE FROM track_features
+                 WHERE schema_version != ? OR fetched_at < ?
+            """, (self.schema_version, min_fetched_at))
+            deleted = cur.rowcount
+            for kind, ttl in self.failure_ttl_seconds.items():
+                cur = self._conn.execute("""
+                    DELETE FROM track_failures
+                     WHERE kind = ? AND failed_at < ?
+                """, (kind, now - ttl))
+                deleted += cur.rowcount
+            self._conn.commit()
+            return deleted
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM track_features").fetchone()[0]
+
+    def import_legacy_csv(self, csv_path: str = LEGACY_CACHE_CSV) -> int:
+        """
+        旧来の soundstat_cache.csv を読み込み、DBに取り込む。
+        CSVの 'features' / 'artists' 列はPythonのリテラル表記で保存されている。
+        各行の取得時刻は分からないため、CSVの更新時刻を取得時刻として扱う（有効期限切れのCSVは取り込まない）。
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        fetched_at = os.path.getmtime(csv_path)
+        if time.time() - fetched_at >= self.ttl_seconds:
+            print(f"情報: {csv_path} は有効期限を過ぎているため取り込みません。")
+            return 0
+
+        track_infos = []
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    features = ast.literal_eval(row["features"]) if row.get("features") else None
+                    if not isinstance(features, dict):
+                        # 'Track analysis in progress' など、解析未完了の行は取り込まない
+                        continue
+                    track_infos.append({
+                        "id": row["id"],
+                        "name": row["name"],
+                        "artists": ast.literal_eval(row["artists"]) if row.get("artists") else [],
+                        "genre": row.get("genre") or None,
+                        "popularity": float(row["popularity"]) if row.get("popularity") else None,
+                        "duration_ms": float(row["duration_ms"]) if row.get("duration_ms") else None,
+                        "features": features,
+                    })
+                except (ValueError, SyntaxError) as e:
+                    print(f"警告: キャッシュCSVの行 '{row.get('id')}' を読み込めませんでした: {e}")
+
+        imported = self.put_many(track_infos, fetched_at=fetched_at)
+        print(f"情報: {csv_path} から {imported} 曲の楽曲情報を取り込みました。")
+        return imported
+
+
+_default_store: Optional[FeatureStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_feature_store() -> FeatureStore:
+    """
+    プロセス内で共有するFeatureStoreを返す。
+    初回作成時に有効期限切れの行を削除し、DBが空であれば旧来のCSVキャッシュを取り込む。
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            store = FeatureStore()
+            purged = store.purge_expired()
+            if purged:
+                print(f"情報: 有効期限切れの楽曲情報・失敗記録を {purged} 件削除しました。")
+            if store.count() == 0:
+                store.import_legacy_csv()
+            _default_store = store
+        return _default_store
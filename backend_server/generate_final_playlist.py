@@ -4,7 +4,6 @@ import pandas as pd
 import joblib
 import os
 import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 from dotenv import load_dotenv
 from typing import List, Tuple, Optional
 
@@ -12,7 +11,7 @@ from typing import List, Tuple, Optional
 load_dotenv()
 
 # --- 分離したモジュールから必要な機能を取得 ---
-from spotify_utils import get_playlist_tracks
+from spotify_utils import PLAYLIST_TRACK_ID_FIELDS, get_playlist_tracks, get_spotify_access_token
 from recommend import recommend_songs_for_target
 from pre_process_normalize import process_tracks_directly
 # score_normalizer.pyからのインポートは不要になりました
@@ -85,14 +84,13 @@ def recommend_playlist(
             print("エラー: .envファイルまたは環境変数からSPOTIPY_CLIENT_IDとSPOTIPY_CLIENT_SECRETを読み込めませんでした。")
             return None
             
-        auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
-        access_token = auth_manager.get_access_token(as_dict=False)
+        access_token = get_spotify_access_token()
         print("情報: トークンの取得に成功しました。")
 
         playlist_id = playlist_url.split('/')[-1].split('?')[0]
         print(f"情報: プレイリスト '{playlist_id}' からトラックを取得中...")
         
-        playlist_items = get_playlist_tracks(playlist_id, access_token)
+        playlist_items = get_playlist_tracks(playlist_id, access_token, fields=PLAYLIST_TRACK_ID_FIELDS)
         track_ids = [item['track']['id'] for item in playlist_items if item.get('track') and item['track'].get('id')]
         
         if not track_ids:
@@ -0,0 +1,124 @@
+# inference_batcher.py
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from recommend import FusedLogisticScorer
+
+# 1回の推論にまとめる最大行数と、他のリクエストを待つ最大時間（0以下でまとめずに直接推論する）
+INFERENCE_BATCH_MAX_ROWS = int(os.getenv("INFERENCE_BATCH_MAX_ROWS", "2048"))
+INFERENCE_BATCH_MAX_WAIT_MS = float(os.getenv("INFERENCE_BATCH_MAX_WAIT_MS", "3"))
+
+
+class _PendingRequest:
+    def __init__(self, scorer, X: np.ndarray, start_moods: Optional[tuple]):
+        self.scorer = scorer
+        self.X = X
+        self.start_moods = start_moods
+        self.future: Future = Future()
+
+    @property
+    def group_key(self):
+        # 同じスコアラー（同じモデルバージョン）・同じ開始感情の要求だけを1回の推論にまとめる
+        return id(self.scorer), self.start_moods
+
+
+class InferenceBatcher:
+    """
+    同時に届いた複数リクエストの特徴量行列を1回の推論にまとめるマイクロバッチャー。
+
+    最初の要求が届いてから max_wait_ms 経過するか、合計 max_rows 行に達するまで他の要求を集め、
+    スコアラーごとに行列を連結して predict を1回だけ呼び出し、結果を行数で分割して返す。
+    max_rows 以上の行列はまとめる利点がないため、呼び出し元のスレッドで直接推論する。
+
+    まとめるのは1回のテンソル積で計算できる FusedLogisticScorer のみ。SVCなどの TransitionScorer は
+    行をまとめても1行あたりの計算量が変わらず、推論中はGILを解放して並列に動けるため、
+    1つのスレッドに集めずに呼び出し元のスレッドで直接推論する。
+    """
+
+    def __init__(
+        self,
+        max_rows: int = INFERENCE_BATCH_MAX_ROWS,
+        max_wait_ms: float = INFERENCE_BATCH_MAX_WAIT_MS
+    ):
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, scorer, X: np.ndarray, start_moods: Optional[Sequence[str]] = None) -> Future:
+        """
+        推論を予約し、shape (行数, 開始感情, 目標感情) の遷移確率を返すFutureを返す。
+        """
+        start_moods = tuple(start_moods) if start_moods is not None else None
+        if self.max_wait <= 0 or len(X) >= self.max_rows or not isinstance(scorer, FusedLogisticScorer):
+            future: Future = Future()
+            try:
+                future.set_result(scorer.predict(X, start_moods))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        request = _PendingRequest(scorer, X, start_moods)
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, scorer, X: np.ndarray, start_moods: Optional[Sequence[str]] = None) -> np.ndarray:
+        """submit の結果を待って返す（同期版）。"""
+        return self.submit(scorer, X, start_moods).result()
+
+    def _collect(self) -> List[_PendingRequest]:
+        first = self._queue.get()
+        requests = [first]
+        rows = len(first.X)
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(request)
+            rows += len(request.X)
+        return requests
+
+    def _run(self) -> None:
+        while True:
+            requests = self._collect()
+            groups = {}
+            for request in requests:
+                groups.setdefault(request.group_key, []).append(request)
+            for group in groups.values():
+                self._predict_group(group)
+
+    def _predict_group(self, group: List[_PendingRequest]) -> None:
+        try:
+            X = group[0].X if len(group) == 1 else np.concatenate([r.X for r in group], axis=0)
+            probs = group[0].scorer.predict(X, group[0].start_moods)
+        except Exception as e:
+            for request in group:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in group:
+            request.future.set_result(probs[offset:offset + len(request.X)])
+            offset += len(request.X)
@@ -0,0 +1,100 @@
+# job_store.py
+
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+# 完了したジョブの結果を保持する時間（秒）
+CLASSIFY_JOB_TTL_SECONDS = int(os.getenv("CLASSIFY_JOB_TTL_SECONDS", "3600"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# 処理の段階（stats["stage"] に書き込まれる）
+STAGE_COLLECTING_TRACKS = "collecting_tracks"
+STAGE_FETCHING_FEATURES = "fetching_features"
+STAGE_SCORING = "scoring"
+STAGE_WRITING_PLAYLISTS = "writing_playlists"
+STAGE_DONE = "done"
+
+
+class ClassifyJob:
+    """
+    バックグラウンドで実行するプレイリスト生成ジョブ。
+
+    progress は処理中の関数に stats として渡す辞書そのもので、
+    取得済み楽曲数やスコア計算済みの組み合わせ数などが処理の進行に合わせて更新される。
+    """
+
+    def __init__(self, user_id: str, playlist_ids: List[str]):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.playlist_ids = list(playlist_ids)
+        self.status = JOB_QUEUED
+        self.progress: dict = {}
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.task = None  # 実行中の asyncio.Task（ガベージコレクションされないよう保持する）
+
+    def start(self) -> None:
+        self.status = JOB_RUNNING
+        self.updated_at = time.time()
+
+    def finish(self, result: dict, error: Optional[str] = None) -> None:
+        self.result = result
+        self.error = error
+        self.status = JOB_FAILED if error else JOB_SUCCEEDED
+        self.progress["stage"] = STAGE_DONE
+        self.updated_at = time.time()
+
+    def to_dict(self) -> dict:
+        # progress は処理中のスレッドが更新するため、先に複製してから読む
+        progress = dict(self.progress)
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": progress.pop("stage", None),
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobStore:
+    """プロセス内でジョブを保持するストア。完了から ttl_seconds 経過したジョブは破棄する。"""
+
+    def __init__(self, ttl_seconds: int = CLASSIFY_JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, ClassifyJob] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: str, playlist_ids: List[str]) -> ClassifyJob:
+        self.purge_expired()
+        job = ClassifyJob(user_id, playlist_ids)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ClassifyJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def purge_expired(self) -> int:
+        """期限切れのジョブを削除し、削除した件数を返す。"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in (JOB_SUCCEEDED, JOB_FAILED) and job.updated_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
@@ -0,0 +1,56 @@
+# lru_cache.py
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, List, Optional, Tuple
+
+
+class LRUCache:
+    """
+    スレッドセーフな件数上限付きのLRUキャッシュ。
+
+    値の検証（snapshot_id の一致や有効期限など）や複製は、このクラスを使う各キャッシュで行う。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """値を返し、最近使ったものとして記録する。存在しない場合はNone。"""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        """複数のキーの値を1回のロックで返す（存在しないキーはNone）。"""
+        values = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                values.append(value)
+        return values
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.put_many([(key, value)])
+
+    def put_many(self, items: Iterable[Tuple[Hashable, Any]]) -> None:
+        """複数の値を1回のロックで保存し、上限を超えた分を古いものから削除する。"""
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
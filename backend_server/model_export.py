@@ -0,0 +1,71 @@
+# model_export.py
+# 学習済みモデルを、推論サーバーが sklearn なしで読み込める .npz 形式に書き出す。
+
+import os
+
+import numpy as np
+
+from feature_matrix import MODEL_FEATURE_COLUMNS
+from recommend import MOOD_ORDER, NPZ_FORMAT_VERSION
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+
+
+def numpy_model_path(mood: str, model_dir: str = MODEL_DIR) -> str:
+    """感情名から .npz のパスを返す（例: 'Relax/Chill' → model/model_Relax-Chill.npz）"""
+    return os.path.join(model_dir, f"model_{mood.replace('/', '-')}.npz")
+
+
+def export_numpy_model(model, output_path: str) -> None:
+    """
+    多クラスのロジスティック回帰モデルの推論パラメータを .npz に書き出す。
+
+    係数・切片・クラス名・特徴量の列順のみを保存する。前処理パラメータは
+    model/preprocessing.json から読み込まれるため同梱しない。
+
+    Args:
+        model: 学習済みの LogisticRegression。
+        output_path: 書き出し先のパス。
+
+    Raises:
+        ValueError: 書き出せないモデルの場合。推論サーバーは .npz を .joblib より優先して読み込むため、
+            以前に書き出した .npz が残っていれば削除する（新しく学習した .joblib が使われるようにする）。
+    """
+    error = None
+    if type(model).__name__ != 'LogisticRegression' or len(getattr(model, 'classes_', [])) < 3:
+        error = f".npz に書き出せるのは多クラスのロジスティック回帰のみです: {type(model).__name__}"
+    elif model.coef_.shape[1] != len(MODEL_FEATURE_COLUMNS):
+        error = f"特徴量数がモデルの列定義と一致しません: {model.coef_.shape[1]}"
+    if error:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+            error += f"（古い '{output_path}' を削除しました）"
+        raise ValueError(error)
+
+    arrays = {
+        "format_version": np.array(NPZ_FORMAT_VERSION),
+        "coef": np.asarray(model.coef_, dtype=np.float32),
+        "intercept": np.asarray(model.intercept_, dtype=np.float32),
+        "classes": np.asarray([str(c) for c in model.classes_]),
+        "columns": np.asarray(MODEL_FEATURE_COLUMNS),
+    }
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    np.savez(output_path, **arrays)
+    print(f"推論用パラメータを '{output_path}' に保存しました。")
+
+
+def export_all_from_joblib(model_dir: str = MODEL_DIR) -> None:
+    """model/model_<感情>.joblib を全て .npz に書き出す。"""
+    import joblib
+
+    for mood in MOOD_ORDER:
+        joblib_path = os.path.join(model_dir, f"model_{mood.replace('/', '-')}.joblib")
+        try:
+            export_numpy_model(joblib.load(joblib_path), numpy_model_path(mood, model_dir))
+        except (FileNotFoundError, ValueError) as e:
+            print(f"警告: '{joblib_path}' を書き出せませんでした: {e}")
+
+
+if __name__ == "__main__":
+    export_all_from_joblib()
@@ -0,0 +1,230 @@
+# model_registry.py
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from feature_matrix import MODEL_FEATURE_COLUMNS, PREPROCESSING_ARTIFACT_PATH, FeaturePreprocessor
+from recommend import NumpyLogisticModel, build_transition_scorer
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+
+
+def model_path(mood: str, model_dir: str = MODEL_DIR) -> str:
+    """
+    感情名からモデルファイルのパスを返す（例: 'Relax/Chill' → model/model_Relax-Chill.npz）。
+    sklearnなしで読み込める .npz があればそちらを優先し、なければ .joblib を返す。
+    """
+    base = os.path.join(model_dir, f"model_{mood.replace('/', '-')}")
+    if os.path.exists(base + ".npz"):
+        return base + ".npz"
+    return base + ".joblib"
+
+
+def _deserialize(path: str, data: bytes):
+    if path.endswith(".npz"):
+        model = NumpyLogisticModel.load(io.BytesIO(data))
+        if model.columns != MODEL_FEATURE_COLUMNS:
+            raise ValueError(f"'{path}' の特徴量の列順がモデルの列順と一致しません: {model.columns}")
+        return model
+    # .joblib の読み込みにはsklearnが必要になるため、使うときだけ読み込む
+    import joblib
+    return joblib.load(io.BytesIO(data))
+
+
+class _LoadedModel:
+    def __init__(self, model, digest: str, mtime: float, size: int):
+        self.model = model
+        self.digest = digest
+        self.mtime = mtime
+        self.size = size
+
+
+class ModelRegistry:
+    """
+    開始感情ごとのモデルをメモリ上に保持するレジストリ。
+
+    起動時に全モデルを読み込み、リクエストごとのディスクI/Oや逆シリアライズをなくす。
+    モデルファイルの更新時刻やサイズが変わった場合は内容のハッシュを確認し、
+    変わっていれば読み込み直して差し替える（読み込みに失敗した場合は古いモデルを使い続ける）。
+    学習時の前処理パラメータ（preprocessing.json）もモデルと同じ方法で監視し、バージョンに含める。
+    """
+
+    def __init__(
+        self,
+        moods: List[str],
+        model_dir: str = MODEL_DIR,
+        preprocessing_path: str = PREPROCESSING_ARTIFACT_PATH,
+        check_interval: float = float(os.getenv("MODEL_RELOAD_CHECK_INTERVAL", "5"))
+    ):
+        self.moods = list(moods)
+        self.model_dir = model_dir
+        self.check_interval = check_interval
+        self.preprocessing_path = preprocessing_path
+        self._models: Dict[str, _LoadedModel] = {}
+        self._preprocessing: Optional[_LoadedModel] = None
+        self._version: Optional[str] = None
+        self._scorer = None
+        self._reload_listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._last_checked = 0.0
+
+    def _load(self, mood: str) -> _LoadedModel:
+        path = model_path(mood, self.model_dir)
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        model = _deserialize(path, data)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        print(f"情報: モデル '{path}' を読み込みました。バージョン: {digest}")
+        return _LoadedModel(model, digest, stat.st_mtime, stat.st_size)
+
+    def _load_preprocessing(self) -> Optional[_LoadedModel]:
+        """前処理パラメータを読み込む。ファイルがない場合はNone（バッチ内での正規化にフォールバック）。"""
+        if not os.path.exists(self.preprocessing_path):
+            return None
+        stat = os.stat(self.preprocessing_path)
+        with open(self.preprocessing_path, "rb") as f:
+            data = f.read()
+        preprocessor = FeaturePreprocessor.from_dict(json.loads(data.decode("utf-8")))
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        print(f"情報: 前処理パラメータ '{self.preprocessing_path}' を読み込みました。バージョン: {digest}")
+        return _LoadedModel(preprocessor, digest, stat.st_mtime, stat.st_size)
+
+    def _update_version(self) -> None:
+        combined = "|".join(f"{mood}:{self._models[mood].digest}" for mood in self.moods if mood in self._models)
+        if self._preprocessing is not None:
+            combined += f"|preprocessing:{self._preprocessing.digest}"
+        self._version = hashlib.sha256(combined.encode("utf-8")).hexdigest()[:12]
+        # モデルが差し替わるたびに、推論用のスコアラーも作り直す
+        self._scorer = build_transition_scorer(
+            {mood: loaded.model for mood, loaded in self._models.items()}, self.moods
+        )
+        print(f"情報: スコアラー: {type(self._scorer).__name__}")
+
+    def add_reload_listener(self, listener: Callable[[str], None]) -> None:
+        """モデルが（再）読み込みされたときに新しいバージョンIDを受け取るコールバックを登録する。"""
+        self._reload_listeners.append(listener)
+
+    def _notify_reload(self) -> None:
+        for listener in self._reload_listeners:
+            try:
+                listener(self._version)
+            except Exception as e:
+                print(f"警告: モデル再読み込みの通知に失敗しました: {e}")
+
+    def load_all(self) -> None:
+        """全てのモデルを読み込む（アプリ起動時に呼び出す）。"""
+        loaded = {mood: self._load(mood) for mood in self.moods}
+        preprocessing = self._load_preprocessing()
+        with self._lock:
+            self._models = loaded
+            self._preprocessing = preprocessing
+            self._update_version()
+            self._last_checked = time.monotonic()
+        self._notify_reload()
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        モデルファイルの変更を確認し、変更があれば読み込み直す。
+
+        Returns:
+            bool: 1つ以上のモデルまたは前処理パラメータを差し替えた場合True。
+        """
+        now = time.monotonic()
+        if not force and now - self._last_checked < self.check_interval:
+            return False
+        # 他のスレッドが確認中であれば、そちらに任せて現在のモデルを使う
+        if not self._reload_lock.acquire(blocking=force):
+            return False
+        try:
+            return self._reload_changed(now)
+        finally:
+            self._reload_lock.release()
+
+    def _reload_changed(self, now: float) -> bool:
+        self._last_checked = now
+        reloaded = {}
+        for mood in self.moods:
+            current = self._models.get(mood)
+            try:
+                stat = os.stat(model_path(mood, self.model_dir))
+                if current and (stat.st_mtime, stat.st_size) == (current.mtime, current.size):
+                    continue
+                candidate = self._load(mood)
+            except Exception as e:
+                print(f"警告: モデル '{mood}' の再読み込みに失敗しました。現在のモデルを使い続けます: {e}")
+                continue
+            if current is None or candidate.digest != current.digest:
+                reloaded[mood] = candidate
+            else:
+                # 内容が同じ（touchされただけ）なら更新時刻だけ記録し直す
+                current.mtime, current.size = candidate.mtime, candidate.size
+
+        preprocessing = self._reload_preprocessing()
+        if not reloaded and preprocessing is None:
+            return False
+        with self._lock:
+            models = dict(self._models)
+            models.update(reloaded)
+            self._models = models
+            if preprocessing is not None:
+                self._preprocessing = preprocessing
+            self._update_version()
+        if preprocessing is not None:
+            reloaded["preprocessing"] = preprocessing
+        print(f"情報: モデルを再読み込みしました: {list(reloaded)}。バージョン: {self._version}")
+        self._notify_reload()
+        return True
+
+    def _reload_preprocessing(self) -> Optional[_LoadedModel]:
+        """前処理パラメータが変わっていれば読み込み直したものを返し、変わっていなければNoneを返す。"""
+        current = self._preprocessing
+        try:
+            if not os.path.exists(self.preprocessing_path):
+                return None
+            stat = os.stat(self.preprocessing_path)
+            if current and (stat.st_mtime, stat.st_size) == (current.mtime, current.size):
+                return None
+            candidate = self._load_preprocessing()
+        except Exception as e:
+            print(f"警告: 前処理パラメータの再読み込みに失敗しました。現在のパラメータを使い続けます: {e}")
+            return None
+        if candidate is None:
+            return None
+        if current is None or candidate.digest != current.digest:
+            return candidate
+        current.mtime, current.size = candidate.mtime, candidate.size
+        return None
+
+    def pipeline_snapshot(self):
+        """
+        リクエスト中に一貫して使うスコアラー・前処理パラメータとバージョンを返す。
+
+        Returns:
+            tuple: (スコアラー, FeaturePreprocessor または None, バージョンID)
+        """
+        if not self._models:
+            self.load_all()
+        else:
+            self.refresh()
+        with self._lock:
+            preprocessor = self._preprocessing.model if self._preprocessing is not None else None
+            return self._scorer, preprocessor, self._version
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    def describe(self) -> Dict[str, str]:
+        """感情ごとのモデルと前処理パラメータのバージョン（ヘルスチェック用）。"""
+        with self._lock:
+            versions = {mood: loaded.digest for mood, loaded in self._models.items()}
+            if self._preprocessing is not None:
+                versions["preprocessing"] = self._preprocessing.digest
+            return versions
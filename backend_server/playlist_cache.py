@@ -0,0 +1,39 @@
+# playlist_cache.py
+
+import os
+from typing import Optional
+
+from lru_cache import LRUCache
+
+# 楽曲一覧を保持するプレイリスト数の上限
+PLAYLIST_CACHE_MAX_ENTRIES = int(os.getenv("PLAYLIST_CACHE_MAX_ENTRIES", "1000"))
+
+
+class PlaylistItemsCache:
+    """
+    プレイリストの楽曲一覧を snapshot_id 付きで保持するLRUキャッシュ。
+
+    Spotifyのプレイリストは内容が変わると snapshot_id が変わるため、
+    保存時と同じ snapshot_id の場合のみ保存済みの楽曲一覧を返す。
+    要求したフィールドによって楽曲項目の内容が異なるため、(playlist_id, fields) ごとに保持する。
+    """
+
+    def __init__(self, max_entries: int = PLAYLIST_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = LRUCache(max_entries)  # {(playlist_id, fields): (snapshot_id, 楽曲一覧)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, playlist_id: str, snapshot_id: str, fields: Optional[str] = None) -> Optional[list]:
+        """snapshot_id が一致する場合のみ楽曲一覧を返す。一致しない・存在しない場合はNone。"""
+        entry = self._entries.get((playlist_id, fields))
+        if entry is None or entry[0] != snapshot_id:
+            return None
+        return list(entry[1])
+
+    def put(self, playlist_id: str, snapshot_id: str, items: list, fields: Optional[str] = None) -> None:
+        self._entries.put((playlist_id, fields), (snapshot_id, list(items)))
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -1,63 +1,15 @@
 import pandas as pd
 import numpy as np
-import requests
 import os
-import time
 from urllib.parse import urlparse
 import json
-from sklearn.preprocessing import MinMaxScaler, OneHotEncoder 
-from sklearn.compose import ColumnTransformer 
-import joblib 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-def get_soundstat_track_info(spotify_track_id: str):
-    """
-    Soundstat APIを使用して、指定されたSpotifyトラックIDの楽曲情報を取得します。
-
-    Args:
-        spotify_track_id (str): SpotifyのトラックID。
-
-    Returns:
-        dict: APIから返された楽曲情報の辞書。エラーの場合はNoneを返します。
-    """
-    # 環境変数からAPIキーを取得
-    api_key = os.getenv("SOUNDSTAT_API_KEY")
-    if not api_key:
-        print("エラー: 環境変数 'SOUNDSTAT_API_KEY' が設定されていません。")
-        return None
-
-    # Soundstat APIのエンドポイント
-    api_url = f"https://soundstat.info/api/v1/track/{spotify_track_id}"
-    
-    # リクエストヘッダーにAPIキーを設定
-    headers = {
-        "X-API-Key": api_key
-    }
-    
-    # クエリパラメータにトラックIDを設定
-    params = {
-        "id": spotify_track_id
-    }
-
-    print(f"'{spotify_track_id}' の情報を取得中...")
-
-    try:
-        # response = requests.get(api_url, headers=headers, params=params)
-        response = requests.get(api_url, headers=headers)
-        
-        # リクエストが成功したかチェック
-        response.raise_for_status()  # 200番台以外のステータスコードの場合に例外を発生させる
-
-        # JSONレスポンスを辞書に変換して返す
-        return response.json()
-
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTPエラーが発生しました: {http_err}")
-        print(f"レスポンス内容: {response.text}")
-    except requests.exceptions.RequestException as req_err:
-        print(f"リクエストエラーが発生しました: {req_err}")
-    
-    return None
+from typing import Callable, Iterator, Optional, Tuple
+from feature_matrix import (
+    MODEL_FEATURE_COLUMNS, PREPROCESSING_ARTIFACT_PATH, RAW_FEATURE_COLUMNS,
+    FeatureMatrixBuilder, FeaturePreprocessor, get_preprocessor
+)
+from feature_store import FAILURE_TRANSIENT, get_feature_store
+from soundstat_client import get_soundstat_track_info, iter_soundstat_track_infos
 
 def extract_track_id_from_url(url):
     try:
@@ -152,6 +104,9 @@ def normalize_and_encode_data(input_csv, output_csv_normalized):
     """
     指定されたCSVファイルの数値データを0-1に正規化し、カテゴリ特徴量をOne-Hotエンコードします。
     """
+    # 学習データ作成時のみ使うため、推論サーバーの起動時にはsklearnを読み込まない
+    from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+
     df = pd.read_csv(input_csv)
 
     # 数値データとカテゴリデータの識別
@@ -197,150 +152,193 @@ def normalize_and_encode_data(input_csv, output_csv_normalized):
     df.to_csv(output_csv_normalized, index=False)
     print(f"正規化およびエンコードされたデータを {output_csv_normalized} に保存しました。")
 
-def normalize_and_encode_dataframe(df):
+# ストリーミング処理で1度に下流へ渡す楽曲数
+FEATURE_BATCH_SIZE = 256
+
+def iter_track_feature_batches(
+    track_ids: list,
+    builder: FeatureMatrixBuilder,
+    batch_size: int = FEATURE_BATCH_SIZE,
+    stats: Optional[dict] = None
+) -> Iterator[Tuple[int, int]]:
     """
-    DataFrameの数値データを0-1に正規化し、カテゴリ特徴量をOne-Hotエンコードします。
-    CSVを介さずに直接DataFrameを処理します。
+    トラックIDのリストから特徴量を取得して builder の行列に書き込み、
+    batch_size 曲ごとに書き込んだ行の範囲を順次返します。
+
+    キャッシュ済みの楽曲はすぐに返し、Soundstatから取得する楽曲は取得が完了した順に返すため、
+    呼び出し側は全件の取得を待たずに後段の処理を始められます。
+
+    Args:
+        track_ids: SpotifyトラックIDのリスト。
+        builder: 特徴量を書き込むFeatureMatrixBuilder。
+        batch_size: 1バッチあたりの楽曲数。
+        stats: 指定した場合、キャッシュヒット数や失敗数などの集計を書き込みます。
+
+    Yields:
+        tuple: (start, stop)。builder.raw[start:stop] が新たに書き込まれた行。
     """
-    if df.empty:
-        print("入力DataFrameが空です。")
-        return df
+    stats = {} if stats is None else stats
+    stats.update({
+        "requested": len(track_ids),
+        "cache_hits": 0,
+        "negative_cache_hits": 0,
+        "fetched": 0,
+        "not_found": 0,
+        "transient": 0,
+    })
+    if not track_ids:
+        return
 
-    # 欠損値を平均値で補完
-    numerical_features = [
-        'popularity', 'duration_ms', 'tempo', 'key_confidence', 'energy',
-        'danceability', 'valence', 'instrumentalness', 'acousticness',
-        'loudness', 'segments_count', 'segments_avg_duration',
-        'beats_count', 'beats_regularity'
+    batch_start = len(builder)
+    fail_list = []
+    failures = {}
+
+    # キャッシュ済みの楽曲情報を先に読み込み、キャッシュミスのみSoundstatに問い合わせる
+    store = get_feature_store()
+    cached_infos = store.get_many(track_ids)
+    # 最近取得に失敗したトラックは問い合わせずにスキップする
+    known_failures = store.get_failures(
+        [track_id for track_id in track_ids if track_id not in cached_infos]
+    )
+    missing_ids = [
+        track_id for track_id in track_ids
+        if track_id not in cached_infos and track_id not in known_failures
     ]
-    
-    # 数値特徴量の欠損値を平均値で補完
-    for col in numerical_features:
-        if col in df.columns:
-            if df[col].isnull().any():
-                mean_value = df[col].mean()
-                df[col] = df[col].fillna(mean_value)
-                print(f"列 '{col}' の欠損値を平均値 {mean_value:.4f} で補完しました。")
-    
-    # カテゴリ特徴量の欠損値を最頻値で補完
-    categorical_features = ['key']  # modeとgenreを除外
-
-    # DataFrameに実際に存在する列のみを対象とする
-    numerical_features = [col for col in numerical_features if col in df.columns]
-    categorical_features = [col for col in categorical_features if col in df.columns]
+    stats["cache_hits"] = len(cached_infos)
+    stats["negative_cache_hits"] = len(known_failures)
+    fail_list.extend(known_failures)
+    for kind in known_failures.values():
+        stats[kind] += 1
+    print(f"情報: キャッシュヒット {len(cached_infos)} 曲、既知の失敗 {len(known_failures)} 曲、Soundstatから取得 {len(missing_ids)} 曲")
+
+    for track_id, track_info in cached_infos.items():
+        try:
+            builder.add(track_info)
+        except Exception as e:
+            print(f"エラーが発生しました: {e}")
+            fail_list.append(track_id)
+            continue
+        if len(builder) - batch_start >= batch_size:
+            yield batch_start, len(builder)
+            batch_start = len(builder)
+
+    # 共有ワーカーで並行に取得し、完了した順に特徴量を抽出する
+    fetched_infos = []
+    for track_id, track_info, failure_kind in iter_soundstat_track_infos(missing_ids):
+        if not track_info:
+            fail_list.append(track_id)
+            if failure_kind:
+                failures[track_id] = failure_kind
+                stats[failure_kind] += 1
+            print(f"track_id: {track_id} の情報が取得できませんでした。")
+            continue
+        try:
+            builder.add(track_info)
+            fetched_infos.append(track_info)
+            stats["fetched"] += 1
+        except Exception as e:
+            # 解析が完了していない楽曲などは特徴量が欠けているため、一時的な失敗として扱う
+            print(f"エラーが発生しました: {e}")
+            fail_list.append(track_id)
+            failures[track_id] = FAILURE_TRANSIENT
+            stats[FAILURE_TRANSIENT] += 1
+            continue
+        if len(builder) - batch_start >= batch_size:
+            # 特徴量を抽出できた楽曲のみキャッシュに保存してから下流に渡す
+            store.put_many(fetched_infos)
+            fetched_infos = []
+            yield batch_start, len(builder)
+            batch_start = len(builder)
+    store.put_many(fetched_infos)
+    store.put_failures(failures)
+    if len(builder) > batch_start:
+        yield batch_start, len(builder)
 
-    # Min-Max Scaling
-    if numerical_features:
-        scaler = MinMaxScaler()
-        df[numerical_features] = scaler.fit_transform(df[numerical_features])
-        print(f"数値特徴量を0-1に正規化しました: {numerical_features}")
-    else:
-        print("0-1正規化する数値特徴量が見つかりませんでした。")
+    print(f"失敗したトラックID: {fail_list}")
+    print(f"失敗したトラックの数: {len(fail_list)}")
 
-    # One-Hot Encoding
-    if categorical_features:
-        encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=False)
-        encoded_features = encoder.fit_transform(df[categorical_features])
-        # 新しいOne-Hotエンコードされた列名を取得
-        encoded_df = pd.DataFrame(encoded_features, columns=encoder.get_feature_names_out(categorical_features))
-        
-        # key列を0.0〜11.0で固定（プレイリストに含まれるkeyに関係なく12個の列を生成）
-        if 'key' in categorical_features:
-            # 全てのkey列（key_0.0〜key_11.0）を生成
-            all_key_columns = [f'key_{i}.0' for i in range(12)]
-            
-            # 現在のDataFrameに存在するkey列を取得
-            existing_key_columns = [col for col in encoded_df.columns if col.startswith('key_')]
-            
-            # 存在しないkey列を0で埋めて追加
-            for key_col in all_key_columns:
-                if key_col not in existing_key_columns:
-                    encoded_df[key_col] = 0
-            
-            # 列の順序を統一（key_0.0〜key_11.0の順）
-            key_columns_ordered = [f'key_{i}.0' for i in range(12)]
-            other_columns = [col for col in encoded_df.columns if not col.startswith('key_')]
-            encoded_df = encoded_df[key_columns_ordered + other_columns]
-        
-        # 元のカテゴリ特徴量列を削除し、エンコードされた特徴量を結合
-        df = pd.concat([df.drop(columns=categorical_features), encoded_df], axis=1)
-        print(f"カテゴリ特徴量をOne-Hotエンコードしました: {categorical_features}")
-    else:
-        print("One-Hotエンコードするカテゴリ特徴量が見つかりませんでした。")
-    print(df.columns)
-    return df
+def save_preprocessing_artifact(input_csv: str, output_path: str = PREPROCESSING_ARTIFACT_PATH) -> FeaturePreprocessor:
+    """
+    学習データ（正規化前のCSV）から推論用の前処理パラメータを求め、モデルと同じディレクトリに保存します。
+    """
+    df = pd.read_csv(input_csv)
+    raw = df[RAW_FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+    preprocessor = FeaturePreprocessor.fit(raw)
+    preprocessor.save(output_path)
+    print(f"前処理パラメータを {output_path} に保存しました。バージョン: {preprocessor.version}")
+    return preprocessor
+
+# process_tracks_to_matrix で preprocessor が省略されたことを表す値（Noneは「前処理パラメータなし」を表す）
+_DEFAULT_PREPROCESSOR = object()
+
+def process_tracks_to_matrix(
+    track_ids: list,
+    stats: Optional[dict] = None,
+    on_batch: Optional[Callable[[np.ndarray, np.ndarray], None]] = None,
+    preprocessor=_DEFAULT_PREPROCESSOR
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    トラックIDのリストから特徴量を取得し、DataFrameを介さずにモデル入力の行列を作成します。
 
-def process_tracks_directly(track_ids: list) -> pd.DataFrame:
-    if not track_ids:
-        return pd.DataFrame()
+    学習時の前処理パラメータ（model/preprocessing.json）がある場合は、取得したマイクロバッチごとに
+    変換し、on_batch にその場で渡します。ない場合は全件が揃ってからバッチ内で正規化します。
 
-    features_list = []
-    fail_list = []
+    Args:
+        track_ids: SpotifyトラックIDのリスト。
+        stats: 指定した場合、キャッシュヒット数や失敗数などの集計を書き込みます。
+        on_batch: 変換済みのマイクロバッチ (track_ids, X) を受け取るコールバック。
+        preprocessor: 使用する前処理パラメータ（ModelRegistry から取得したもの）。
+            省略時は get_preprocessor() の結果を使い、Noneを渡すとバッチ内で正規化します。
 
-    chunk_size = 100
-    id_chunks = [track_ids[i:i + chunk_size] for i in range(0, len(track_ids), chunk_size)]
-
-    for i, chunk in enumerate(id_chunks):
-        print(f"--- チャンク {i+1}/{len(id_chunks)} ({len(chunk)}曲) の処理を開始... ---")
-        with ThreadPoolExecutor(max_workers=chunk_size) as executor:
-            future_to_track_id = {executor.submit(get_soundstat_track_info, track_id): track_id for track_id in chunk}
-            for future in as_completed(future_to_track_id):
-                track_id = future_to_track_id[future]
-                try:
-                    track_info = future.result()
-                    if track_info:
-                        features = {
-                        'id': track_info['id'],
-                        'name': track_info['name'],
-                        'artists': track_info['artists'],
-                        # 'genre': track_info['genre'],
-                        'popularity': track_info['popularity'],
-                        'duration_ms': track_info['duration_ms'],
-
-                        # Audio features
-                        'tempo': track_info['features']['tempo'],
-                        'key': track_info['features']['key'],
-                        # 'mode': track_info['features']['mode'],
-                        'key_confidence': track_info['features']['key_confidence'],
-                        'energy': track_info['features']['energy'],
-                        'danceability': track_info['features']['danceability'],
-                        'valence': track_info['features']['valence'],
-                        'instrumentalness': track_info['features']['instrumentalness'],
-                        'acousticness': track_info['features']['acousticness'],
-                        'loudness': track_info['features']['loudness'],
-
-                        # Segments info
-                        'segments_count': track_info['features']['segments']['count'],
-                        'segments_avg_duration': track_info['features']['segments']['average_duration'],
-
-                        # Beats info
-                        'beats_count': track_info['features']['beats']['count'],
-                        'beats_regularity': track_info['features']['beats']['regularity'],
-                        }
-                        features_list.append(features)
-                    else:
-                        fail_list.append(track_id)
-                        print(f"track_id: {track_id} の情報が取得できませんでした。")
-                except Exception as e:
-                    print(f"エラーが発生しました: {e}")
-                    fail_list.append(track_id)
-        time.sleep(1)  # チャンク間でAPI負荷軽減
-
-    if not features_list:
-        print("有効な特徴量を取得できませんでした。")
-        return pd.DataFrame()
+    Returns:
+        tuple: (track_ids, X)。X は MODEL_FEATURE_COLUMNS 順のfloat32行列。
+            特徴量を取得できなかった楽曲は含まれない。
+    """
+    builder = FeatureMatrixBuilder(capacity=len(track_ids))
+    if preprocessor is _DEFAULT_PREPROCESSOR:
+        preprocessor = get_preprocessor()
+
+    if preprocessor is None:
+        # 正規化の範囲をリクエスト内の全楽曲から求めるため、全件が揃ってから行う
+        for _ in iter_track_feature_batches(track_ids, builder, stats=stats):
+            pass
+        ids, X = builder.build()
+        if on_batch is not None and len(ids):
+            on_batch(ids, X)
+    else:
+        X = np.empty((len(track_ids), len(MODEL_FEATURE_COLUMNS)), dtype=np.float32)
+        for start, stop in iter_track_feature_batches(track_ids, builder, stats=stats):
+            # 前処理が他の楽曲に依存しないため、届いたバッチから順に変換できる
+            X[start:stop] = preprocessor.transform(builder.raw[start:stop])
+            if on_batch is not None:
+                on_batch(np.asarray(builder.ids[start:stop], dtype=object), X[start:stop])
+        ids, X = np.asarray(builder.ids, dtype=object), X[:len(builder)]
+
+    print(f"前処理完了: {len(ids)} 曲の特徴量を処理しました。")
+    return ids, X
+
+def process_tracks_directly(track_ids: list, stats: Optional[dict] = None) -> pd.DataFrame:
+    """
+    トラックIDのリストから特徴量を取得し、正規化・エンコード済みのDataFrameを返します。
 
-    df = pd.DataFrame(features_list)
-    if df.empty:
+    Args:
+        track_ids: SpotifyトラックIDのリスト。
+        stats: 指定した場合、キャッシュヒット数や失敗数などの集計を書き込みます。
+    """
+    builder = FeatureMatrixBuilder(capacity=len(track_ids))
+    for _ in iter_track_feature_batches(track_ids, builder, stats=stats):
+        pass
+    if len(builder) == 0:
         print("有効な特徴量を取得できませんでした。")
         return pd.DataFrame()
 
-    # 欠損値補完・正規化・エンコード
-    df = normalize_and_encode_dataframe(df)
+    ids, X = builder.build(preprocessor=get_preprocessor())
+    df = pd.DataFrame(X, columns=MODEL_FEATURE_COLUMNS)
+    df.insert(0, 'id', ids)
+    df.insert(1, 'name', builder.names)
+    df.insert(2, 'artists', builder.artists)
 
     print(f"前処理完了: {len(df)} 曲の特徴量を処理しました。")
-    print(f"失敗したトラックID: {fail_list}")
-    print(f"失敗したトラックの数: {len(fail_list)}")
 
     return df
 
@@ -366,6 +364,9 @@ if __name__ == "__main__":
         output_csv_normalized="data/music_data_normalized_encoded.csv" 
     )
     print("--- データ正規化とOne-Hotエンコードが完了しました ---")
+
+    # 推論時に同じ正規化を再現するため、学習データの前処理パラメータを保存する
+    save_preprocessing_artifact("data/processed_music_data.csv")
     
     
     if os.path.exists("data/music_data_normalized_encoded.csv"):
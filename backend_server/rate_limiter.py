@@ -0,0 +1,197 @@
+# rate_limiter.py
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+# 過負荷とみなしてリトライするステータスコード
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class AdaptiveRateLimiter:
+    """
+    トークンバケットとAIMD（加算増加・乗算減少）を組み合わせたリミッター。
+
+    - AIMD: 成功するたびに同時実行数の上限と1秒あたりのリクエスト数を少しずつ増やし、
+      429/5xxを受けたら両方を decrease_factor 倍に減らす。
+      減少は1ラウンドトリップにつき1回まで（前回減らした時点より前に送ったリクエストの429は数えない）。
+    - トークンバケット: 1秒あたりのリクエスト数を現在のレート（上限は rate）に制限する。
+      rate=None の場合はレートを制限せず、同時実行数のAIMDだけで調整する。
+    - Retry-After: サーバーから待機時間を指定された場合、全スレッドの新規リクエストを一時停止する。
+
+    複数スレッドから共有して使う想定。
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        initial_concurrency: Optional[int] = None,
+        decrease_factor: float = 0.5,
+        min_rate: float = 1.0
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate or 1))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.min_rate = min_rate
+
+        self._concurrency_limit = float(initial_concurrency or max(min_concurrency, max_concurrency // 2))
+        self._current_rate = float(rate) if rate else None
+        self._in_flight = 0
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._last_decrease = float("-inf")
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self._concurrency_limit)
+
+    @property
+    def current_rate(self) -> Optional[float]:
+        """現在の1秒あたりのリクエスト数の上限（レートを制限しない場合はNone）。"""
+        return self._current_rate
+
+    def _refill(self, now: float) -> None:
+        if self._current_rate is not None:
+            elapsed = now - self._last_refill
+            self._tokens = min(self.burst, self._tokens + elapsed * self._current_rate)
+        self._last_refill = now
+
+    def acquire(self) -> float:
+        """
+        同時実行枠とトークンの両方が得られるまで待機する。
+
+        Returns:
+            float: 枠を得た時刻（time.monotonic()）。release に渡す。
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = 0.0
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= int(self._concurrency_limit):
+                    wait = None  # 他のリクエストの完了を待つ
+                elif self._current_rate is not None and self._tokens < 1:
+                    wait = (1 - self._tokens) / self._current_rate
+                else:
+                    if self._current_rate is not None:
+                        self._tokens -= 1
+                    self._in_flight += 1
+                    return now
+                self._cond.wait(timeout=wait)
+
+    def release(self, throttled: bool = False, started_at: Optional[float] = None) -> None:
+        """
+        同時実行枠を返却し、結果に応じて上限を調整する。
+
+        Args:
+            throttled: 429や5xxなど、上流から過負荷を示す応答を受けた場合はTrue。
+            started_at: acquire の戻り値。前回の減少より前に送ったリクエストの429では減らさない。
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                if started_at is None or started_at >= self._last_decrease:
+                    self._last_decrease = time.monotonic()
+                    self._concurrency_limit = max(
+                        self.min_concurrency, self._concurrency_limit * self.decrease_factor
+                    )
+                    if self._current_rate is not None:
+                        self._current_rate = max(self.min_rate, self._current_rate * self.decrease_factor)
+            else:
+                # 現在の上限ぶん成功すると上限が1増える（1ラウンドトリップあたり+1）
+                self._concurrency_limit = min(
+                    self.max_concurrency, self._concurrency_limit + 1 / self._concurrency_limit
+                )
+                # レートも同様に、現在のレートぶん成功する（約1秒）ごとに+1する
+                if self._current_rate is not None:
+                    self._current_rate = min(self.rate, self._current_rate + 1 / self._current_rate)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """指定秒数、全スレッドの新規リクエストを停止する（Retry-After用）。"""
+        if seconds <= 0:
+            return
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        with文で同時実行枠を取得する。
+        過負荷を検知した場合は、ブロック内で例外 ThrottledError を送出すること。
+        """
+        started_at = self.acquire()
+        throttled = False
+        try:
+            yield
+        except ThrottledError:
+            throttled = True
+            raise
+        finally:
+            self.release(throttled=throttled, started_at=started_at)
+
+
+class ThrottledError(Exception):
+    """上流のAPIから429や5xxを受けたことを表す例外。"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-Afterヘッダーを秒数に変換する。秒数指定とHTTP日付の両方に対応。
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = 0.5,
+    cap: float = 30.0,
+    retry_after: Optional[float] = None
+) -> float:
+    """
+    リトライまでの待機時間を計算する（Full Jitter方式の指数バックオフ）。
+    Retry-Afterが指定されている場合は、それより短くならないようにする。
+
+    Args:
+        attempt: 何回目のリトライか（0始まり）。
+        base: 初回の待機時間の上限（秒）。
+        cap: 待機時間の最大値（秒）。
+        retry_after: サーバーから指定された待機時間（秒）。
+
+    Returns:
+        float: 待機時間（秒）。
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        # 全クライアントが同時に再開しないよう、少しだけ揺らぎを加える
+        delay = max(delay, retry_after + random.uniform(0, base))
+    return delay
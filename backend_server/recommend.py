@@ -2,6 +2,203 @@
 import numpy as np
 # joblib 可能需要在這邊或 main.py 中被用來載入模型
 
+# 遷移先の感情コードの並び（model.classes_ のアルファベット順と一致）
+MOOD_ORDER = ['Angry/Frustrated', 'Happy/Excited', 'Relax/Chill', 'Tired/Sad']
+
+def _predict_proba_ordered(model, X):
+    """
+    predict_proba の列を MOOD_ORDER の順に並べて返す。
+    classes_ が感情名でない（数値ラベルなど）場合は、そのままの順で返す。
+    """
+    predictions = model.predict_proba(X)
+    classes = list(getattr(model, 'classes_', []))
+    if classes and all(c in MOOD_ORDER for c in classes) and classes != MOOD_ORDER:
+        ordered = np.zeros((predictions.shape[0], len(MOOD_ORDER)), dtype=predictions.dtype)
+        for i, c in enumerate(classes):
+            ordered[:, MOOD_ORDER.index(c)] = predictions[:, i]
+        return ordered
+    return predictions
+
+def predict_transition_tensor(models, X, start_moods=MOOD_ORDER):
+    """
+    全楽曲について、開始感情×目標感情の遷移確率をまとめて計算する関数。
+    開始感情ごとに predict_proba を1回だけ呼び出す。
+
+    Args:
+        models: {開始感情名: 学習済みモデル} の辞書。
+        X: 特徴量行列。shape: (楽曲数, 特徴量数)
+        start_moods: 計算する開始感情のリスト。
+
+    Returns:
+        np.ndarray: shape (楽曲数, len(start_moods), 目標感情数) の遷移確率。
+    """
+    return np.stack([_predict_proba_ordered(models[mood], X) for mood in start_moods], axis=1)
+
+# model_export.py で書き出す .npz の形式のバージョン（形式を変えたらこの値を上げる）
+NPZ_FORMAT_VERSION = 1
+
+def _softmax(logits, axis=-1):
+    logits = logits - logits.max(axis=axis, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=axis, keepdims=True)
+    return logits
+
+class NumpyLogisticModel:
+    """
+    model_export.py で書き出した .npz からロジスティック回帰の推論パラメータを読み込むモデル。
+    sklearn を import せずに predict_proba を計算できる。
+    """
+
+    def __init__(self, coef, intercept, classes, columns=None):
+        self.coef_ = np.asarray(coef, dtype=np.float32)            # (クラス数, 特徴量数)
+        self.intercept_ = np.asarray(intercept, dtype=np.float32)  # (クラス数,)
+        self.classes_ = np.asarray(classes)
+        self.columns = list(columns) if columns is not None else None
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            format_version = int(data['format_version']) if 'format_version' in data.files else None
+            if format_version != NPZ_FORMAT_VERSION:
+                raise ValueError(f".npz の形式のバージョンに対応していません: {format_version}")
+            return cls(
+                coef=data['coef'],
+                intercept=data['intercept'],
+                classes=[str(c) for c in data['classes']],
+                columns=[str(c) for c in data['columns']],
+            )
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return _softmax(X @ self.coef_.T + self.intercept_, axis=-1)
+
+class TransitionScorer:
+    """
+    開始感情ごとのモデルの predict_proba で遷移確率テンソルを計算するスコアラー。
+    どの種類のモデル（SVC, LightGBM など）でも使える。
+    """
+
+    def __init__(self, models, start_moods=MOOD_ORDER):
+        self.models = models
+        self.start_moods = list(start_moods)
+
+    def predict(self, X, start_moods=None):
+        """
+        Returns:
+            np.ndarray: shape (楽曲数, len(start_moods), 目標感情数) の遷移確率。
+        """
+        return predict_transition_tensor(self.models, X, start_moods or self.start_moods)
+
+class FusedLogisticScorer:
+    """
+    多クラスのロジスティック回帰モデル（train.py で学習）専用のスコアラー。
+
+    4つの開始感情モデルの coef_ / intercept_ を (開始感情, 目標感情, 特徴量) のテンソルに
+    まとめておき、1回のテンソル積とsoftmaxで全楽曲の遷移確率を計算する。
+    """
+
+    def __init__(self, coef, intercept, start_moods=MOOD_ORDER):
+        self.coef = np.asarray(coef, dtype=np.float32)             # (S, T, F)
+        self.intercept = np.asarray(intercept, dtype=np.float32)   # (S, T)
+        self.start_moods = list(start_moods)
+
+    @classmethod
+    def from_models(cls, models, start_moods=MOOD_ORDER):
+        """
+        全ての開始感情モデルが多クラス（multinomial）のロジスティック回帰であれば
+        FusedLogisticScorer を作成する。それ以外のモデルが含まれる場合はNoneを返す。
+        """
+        coefs, intercepts = [], []
+        for mood in start_moods:
+            model = models[mood]
+            classes = list(getattr(model, 'classes_', []))
+            if (
+                not hasattr(model, 'coef_')
+                or type(model).__name__ not in ('LogisticRegression', 'NumpyLogisticModel')
+                or getattr(model, 'multi_class', 'auto') not in ('auto', 'multinomial', 'deprecated')
+                or getattr(model, 'solver', 'lbfgs') == 'liblinear'
+                or sorted(classes) != sorted(MOOD_ORDER)
+            ):
+                return None
+            order = [classes.index(c) for c in MOOD_ORDER]
+            coefs.append(np.asarray(model.coef_)[order])
+            intercepts.append(np.asarray(model.intercept_)[order])
+        return cls(np.stack(coefs), np.stack(intercepts), start_moods)
+
+    def predict(self, X, start_moods=None):
+        """
+        Returns:
+            np.ndarray: shape (楽曲数, len(start_moods), 目標感情数) の遷移確率。
+        """
+        coef, intercept = self.coef, self.intercept
+        if start_moods is not None and list(start_moods) != self.start_moods:
+            index = [self.start_moods.index(mood) for mood in start_moods]
+            coef, intercept = coef[index], intercept[index]
+        X = np.asarray(X, dtype=np.float32)
+        logits = np.einsum('nf,stf->nst', X, coef, optimize=True) + intercept
+        return _softmax(logits, axis=-1)
+
+def build_transition_scorer(models, start_moods=MOOD_ORDER):
+    """
+    モデルの種類に応じて最適なスコアラーを返す。
+    ロジスティック回帰であれば FusedLogisticScorer、それ以外は TransitionScorer。
+    """
+    fused = FusedLogisticScorer.from_models(models, start_moods)
+    if fused is not None:
+        return fused
+    return TransitionScorer(models, start_moods)
+
+def recommend_songs_from_probs(track_ids, target_probs, top_k=10):
+    """
+    目標感情への遷移確率から、確率の高い順に Top-K の楽曲を返す関数。
+    """
+    sorted_indices = np.argsort(-target_probs)
+    return [(track_ids[i], target_probs[i]) for i in sorted_indices[:top_k]]
+
+def select_top_tracks(track_ids, target_probs, top_k=None, min_score=None):
+    """
+    目標感情への遷移確率を0から100の移行スコアに正規化し、閾値と Top-K で絞り込む関数。
+    全てNumPy配列上で計算し、Pythonのタプルは最終的に返す楽曲の分だけ作成する。
+
+    スコアは Top-K に残った楽曲の中での最小値・最大値で正規化する
+    （recommend_songs_for_target → normalize_scores と同じ結果）。
+    楽曲が1曲のみ、または全て同じ確率の場合はスコアを50とする。
+
+    Args:
+        track_ids: トラックIDの配列。
+        target_probs: 目標感情への遷移確率の配列。
+        top_k: 候補とする楽曲数の上限。Noneの場合は全楽曲。
+        min_score: 指定した場合、スコアがこの値より大きい楽曲のみ返す。
+
+    Returns:
+        List[Tuple[str, float]]: スコアの降順に並べた (track_id, score) のリスト。
+    """
+    probs = np.asarray(target_probs, dtype=np.float64)
+    n = len(probs)
+    if n == 0:
+        return []
+
+    # Top-K の候補を argpartition で取り出す（全体のソートは行わない）
+    if top_k is not None and top_k < n:
+        candidates = np.argpartition(-probs, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(n)
+    candidate_probs = probs[candidates]
+
+    min_prob = candidate_probs.min()
+    max_prob = candidate_probs.max()
+    if len(candidates) < 2 or min_prob == max_prob:
+        scores = np.full(len(candidates), 50.0)
+    else:
+        scores = (candidate_probs - min_prob) / (max_prob - min_prob) * 100
+
+    if min_score is not None:
+        keep = scores > min_score
+        candidates, scores = candidates[keep], scores[keep]
+
+    order = np.argsort(-scores, kind='stable')
+    return [(track_ids[i], float(score)) for i, score in zip(candidates[order], scores[order])]
+
 def recommend_songs_for_target(model, X, track_ids, target_mood_code, top_k=10):
     """
     訓練済みの LightGBM モデルを使用し、目標感情に合わせた楽曲を推薦する関数。
@@ -13,9 +210,5 @@ def recommend_songs_for_target(model, X, track_ids, target_mood_code, top_k=10):
     # 2. 全楽曲の中から、指定された「目標感情」への遷移確率のみを抽出する (這部分邏輯不變)
     target_probs = predictions[:, target_mood_code]
     
-    # 3. 目標確率に基づいて降順にソートする (這部分邏輯不變)
-    sorted_indices = np.argsort(-target_probs)
-    
-    # 4. Top-Kの推薦結果を整形して返す (這部分邏輯不變)
-    recommended = [(track_ids[i], target_probs[i]) for i in sorted_indices[:top_k]]
-    return recommended
+    # 3-4. 目標確率に基づいて降順にソートし、Top-Kの推薦結果を整形して返す
+    return recommend_songs_from_probs(track_ids, target_probs, top_k=top_k)
@@ -0,0 +1,62 @@
+# result_cache.py
+
+import copy
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from feature_store import FEATURE_STORE_TTL_SECONDS
+from lru_cache import LRUCache
+
+# 保持するプレイリスト生成結果の件数の上限
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+
+# 生成結果を保持する時間（秒）。元にした楽曲特徴量は FEATURE_STORE_TTL_SECONDS を過ぎると取得し直されるため、
+# それより長くは保持しない
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(FEATURE_STORE_TTL_SECONDS)))
+
+
+def make_result_key(
+    snapshot_ids: Dict[str, str],
+    model_version: Optional[str],
+    preprocessing_version: Optional[str]
+) -> Tuple:
+    """
+    生成結果のキャッシュキーを作成する。
+
+    プレイリストの指定順には依存せず、(playlist_id, snapshot_id) の集合とモデル・前処理のバージョンで決まる。
+    どれか1つのプレイリストの内容が変われば snapshot_id が変わるため、別のキーになる。
+    """
+    return tuple(sorted(snapshot_ids.items())), model_version, preprocessing_version
+
+
+class ClassifyResultCache:
+    """
+    プレイリストの組とモデルのバージョンごとに、16個のプレイリストの生成結果を保持するLRUキャッシュ。
+    保存から ttl_seconds 経過した結果は返さない。
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl_seconds: int = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = LRUCache(max_entries)  # {キー: (保存時刻, 生成結果)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[dict]:
+        """保存済みの結果のコピーを返す。存在しないか期限切れの場合はNone。"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at >= self.ttl_seconds:
+            self._entries.pop(key)
+            return None
+        return copy.deepcopy(result)
+
+    def put(self, key: Tuple, result: dict) -> None:
+        self._entries.put(key, (time.monotonic(), copy.deepcopy(result)))
+
+    def clear(self) -> None:
+        self._entries.clear()
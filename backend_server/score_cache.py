@@ -0,0 +1,65 @@
+# score_cache.py
+
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+from lru_cache import LRUCache
+
+# キャッシュする楽曲数の上限（1曲あたり4x4のfloat32）
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "100000"))
+
+
+class TransitionScoreCache:
+    """
+    楽曲ごとの4x4遷移確率行列をメモリ上に保持するLRUキャッシュ。
+
+    遷移確率は楽曲の特徴量とモデル・前処理のバージョンだけで決まるため、
+    (track_id, model_version, preprocessing_version) をキーにする。
+    """
+
+    def __init__(self, max_entries: int = SCORE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = LRUCache(max_entries)  # {(track_id, model_version, preprocessing_version): 4x4行列}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(
+        self,
+        track_ids,
+        model_version: str,
+        preprocessing_version: str
+    ) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """
+        Returns:
+            tuple: (hit_mask, hits)。
+                hit_mask は track_ids と同じ長さのbool配列、hits はヒットした楽曲の4x4行列のリスト（順序は hit_mask と同じ）。
+        """
+        matrices = self._entries.get_many(
+            (track_id, model_version, preprocessing_version) for track_id in track_ids
+        )
+        hit_mask = np.array([matrix is not None for matrix in matrices], dtype=bool)
+        hits = [matrix for matrix in matrices if matrix is not None]
+        return hit_mask, hits
+
+    def put_many(
+        self,
+        track_ids,
+        tensor: np.ndarray,
+        model_version: str,
+        preprocessing_version: str
+    ) -> None:
+        """
+        Args:
+            track_ids: トラックIDのリスト。
+            tensor: shape (len(track_ids), 開始感情, 目標感情) の遷移確率。
+        """
+        self._entries.put_many(
+            ((track_id, model_version, preprocessing_version), np.array(matrix, dtype=np.float32))
+            for track_id, matrix in zip(track_ids, tensor)
+        )
+
+    def clear(self) -> None:
+        self._entries.clear()
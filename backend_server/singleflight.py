@@ -0,0 +1,74 @@
+# singleflight.py
+
+import os
+import threading
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable
+
+try:
+    import fcntl
+except ImportError:  # Windowsではワーカー間の排他は使えない
+    fcntl = None
+
+
+class SingleFlight:
+    """
+    同じキーに対する処理の同時実行を1つにまとめる（single-flight）。
+
+    最初の呼び出し元（リーダー）だけが処理を実行し、実行中に同じキーで呼び出した
+    他のスレッドはその結果（または例外）を待って受け取る。
+    処理が終わるとキーは解放されるため、結果そのものはキャッシュしない。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.coalesced_count = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced_count += 1
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+@contextmanager
+def worker_lock(lock_dir: str, key: str, buckets: int = 1024):
+    """
+    ファイルロックを使って、同じマシン上の複数ワーカー間で同じキーの処理を排他する。
+    ロックファイルが増え続けないよう、キーはハッシュで buckets 個のファイルに振り分ける。
+    fcntlが使えない環境では何もしない。
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(lock_dir, exist_ok=True)
+    bucket = zlib.crc32(key.encode("utf-8")) % buckets
+    lock_path = os.path.join(lock_dir, f"{bucket}.lock")
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,230 @@
+# soundstat_client.py
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from feature_store import FAILURE_NOT_FOUND, FAILURE_TRANSIENT, get_feature_store
+from rate_limiter import (
+    RETRYABLE_STATUS_CODES, AdaptiveRateLimiter, ThrottledError, backoff_delay, parse_retry_after
+)
+from singleflight import SingleFlight, worker_lock
+
+# --- 設定 ---
+SOUNDSTAT_API_URL = "https://soundstat.info/api/v1/track/{track_id}"
+
+# プロセス全体でSoundstatに同時に投げるリクエスト数の上限
+SOUNDSTAT_MAX_CONCURRENCY = int(os.getenv("SOUNDSTAT_MAX_CONCURRENCY", "32"))
+# 1リクエストあたりのタイムアウト（秒）
+SOUNDSTAT_TIMEOUT = float(os.getenv("SOUNDSTAT_TIMEOUT", "15"))
+# 1秒あたりのリクエスト数の上限（Soundstatのプランに合わせて設定する）。
+# 429を受けるとこの値から下げ、成功が続くとこの値まで戻す。0を指定した場合はレートを制限しない
+SOUNDSTAT_RATE_PER_SEC = float(os.getenv("SOUNDSTAT_RATE_PER_SEC", "10")) or None
+# 429/5xx/通信エラー時のリトライ回数
+SOUNDSTAT_MAX_RETRIES = int(os.getenv("SOUNDSTAT_MAX_RETRIES", "4"))
+
+# Soundstatへの全リクエストで共有するリミッター
+soundstat_limiter = AdaptiveRateLimiter(
+    rate=SOUNDSTAT_RATE_PER_SEC,
+    max_concurrency=SOUNDSTAT_MAX_CONCURRENCY
+)
+
+# ワーカー間で取得をまとめる場合のロックファイル置き場（未設定ならプロセス内のみでまとめる）
+SOUNDSTAT_SINGLEFLIGHT_LOCK_DIR = os.getenv("SOUNDSTAT_SINGLEFLIGHT_LOCK_DIR")
+
+# 同じトラックIDの取得を1つにまとめる
+soundstat_singleflight = SingleFlight()
+
+# Keep-Aliveの接続を使い回すため、セッションとワーカーはプロセス内で共有する
+_session: Optional[requests.Session] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_init_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _init_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=SOUNDSTAT_MAX_CONCURRENCY
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _init_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=SOUNDSTAT_MAX_CONCURRENCY,
+                thread_name_prefix="soundstat"
+            )
+        return _executor
+
+
+def get_soundstat_track_info(spotify_track_id: str):
+    """
+    Soundstat APIを使用して、指定されたSpotifyトラックIDの楽曲情報を取得します。
+
+    Args:
+        spotify_track_id (str): SpotifyのトラックID。
+
+    Returns:
+        dict: APIから返された楽曲情報の辞書。エラーの場合はNoneを返します。
+    """
+    track_info, _ = fetch_soundstat_track(spotify_track_id)
+    return track_info
+
+
+def fetch_soundstat_track(spotify_track_id: str) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Soundstat APIから楽曲情報を取得し、失敗した場合はその種類も返します。
+
+    Args:
+        spotify_track_id (str): SpotifyのトラックID。
+
+    Returns:
+        tuple: (track_info, failure_kind)。
+            成功時は (dict, None)。
+            楽曲が存在しない（404）場合は (None, FAILURE_NOT_FOUND)、一時的な失敗は (None, FAILURE_TRANSIENT)。
+            APIキー未設定・401/403など設定の問題の場合は (None, None)（失敗として記録しない）。
+    """
+    # 環境変数からAPIキーを取得
+    api_key = os.getenv("SOUNDSTAT_API_KEY")
+    if not api_key:
+        print("エラー: 環境変数 'SOUNDSTAT_API_KEY' が設定されていません。")
+        return None, None
+
+    # Soundstat APIのエンドポイント
+    api_url = SOUNDSTAT_API_URL.format(track_id=spotify_track_id)
+
+    # リクエストヘッダーにAPIキーを設定
+    headers = {
+        "X-API-Key": api_key
+    }
+
+    print(f"'{spotify_track_id}' の情報を取得中...")
+
+    for attempt in range(SOUNDSTAT_MAX_RETRIES + 1):
+        retry_after = None
+        try:
+            with soundstat_limiter.slot():
+                try:
+                    response = _get_session().get(api_url, headers=headers, timeout=SOUNDSTAT_TIMEOUT)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as conn_err:
+                    # タイムアウトや接続断も過負荷の兆候として扱い、同時実行数を下げる
+                    raise ThrottledError(f"通信エラー: {conn_err}")
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    raise ThrottledError(
+                        f"{response.status_code} {response.reason}",
+                        retry_after=parse_retry_after(response.headers.get("Retry-After"))
+                    )
+
+            # リクエストが成功したかチェック
+            response.raise_for_status()  # 200番台以外のステータスコードの場合に例外を発生させる
+
+            # JSONレスポンスを辞書に変換して返す
+            return response.json(), None
+
+        except ThrottledError as throttled:
+            retry_after = throttled.retry_after
+            if retry_after is not None:
+                # Retry-Afterが指定された場合は、他のスレッドも含めて新規リクエストを止める
+                soundstat_limiter.pause(retry_after)
+            print(f"警告: '{spotify_track_id}' の取得が制限されました ({throttled})。リトライします... ({attempt + 1}/{SOUNDSTAT_MAX_RETRIES})")
+        except requests.exceptions.HTTPError as http_err:
+            print(f"HTTPエラーが発生しました: {http_err}")
+            print(f"レスポンス内容: {http_err.response.text if http_err.response is not None else ''}")
+            if http_err.response is not None and http_err.response.status_code == 404:
+                # 楽曲が存在しない（未解析）場合のみ、一定時間問い合わせないよう記録する
+                return None, FAILURE_NOT_FOUND
+            # 401/403（APIキーの誤り・期限切れ）などは楽曲ではなく設定の問題のため記録しない
+            return None, None
+        except (requests.exceptions.RequestException, ValueError) as req_err:
+            # ValueError: レスポンスがJSONとして解釈できない場合
+            print(f"リクエストエラーが発生しました: {req_err}")
+            return None, FAILURE_TRANSIENT
+
+        if attempt < SOUNDSTAT_MAX_RETRIES:
+            time.sleep(backoff_delay(attempt, retry_after=retry_after))
+
+    print(f"エラー: '{spotify_track_id}' の取得が {SOUNDSTAT_MAX_RETRIES} 回のリトライ後も失敗しました。")
+    return None, FAILURE_TRANSIENT
+
+
+def _fetch_with_worker_lock(spotify_track_id: str):
+    """
+    ワーカー間のロックを取ってから取得する。ロック待ちの間に他のワーカーが
+    取得を終えていればキャッシュから返し、Soundstatには問い合わせない。
+    """
+    with worker_lock(SOUNDSTAT_SINGLEFLIGHT_LOCK_DIR, spotify_track_id):
+        store = get_feature_store()
+        cached = store.get_many([spotify_track_id]).get(spotify_track_id)
+        if cached:
+            return cached, None
+        track_info, failure_kind = fetch_soundstat_track(spotify_track_id)
+        # ロックを離す前に保存し、待っている他のワーカーが読めるようにする
+        if track_info and isinstance(track_info.get("features"), dict):
+            store.put(track_info)
+        elif failure_kind:
+            store.put_failures({spotify_track_id: failure_kind})
+        return track_info, failure_kind
+
+
+def fetch_soundstat_track_coalesced(spotify_track_id: str) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    fetch_soundstat_track の前段に置くsingle-flight層。
+
+    同じトラックIDの取得が既に実行中であれば、新たにリクエストを送らずその結果を待つ。
+    SOUNDSTAT_SINGLEFLIGHT_LOCK_DIR が設定されている場合は、同じマシン上の他のワーカーとも取得をまとめる。
+    """
+    if SOUNDSTAT_SINGLEFLIGHT_LOCK_DIR:
+        return soundstat_singleflight.do(spotify_track_id, _fetch_with_worker_lock, spotify_track_id)
+    return soundstat_singleflight.do(spotify_track_id, fetch_soundstat_track, spotify_track_id)
+
+
+def iter_soundstat_track_infos(
+    track_ids: Iterable[str]
+) -> Iterator[Tuple[str, Optional[dict], Optional[str]]]:
+    """
+    複数のトラックの楽曲情報を共有ワーカーで並行に取得し、完了した順に返します。
+
+    チャンクごとの待ち合わせは行わず、全トラックを一度に投入するため、
+    遅いリクエストがあっても他のワーカーは次のトラックの取得を続けます。
+    同時実行数はプロセス全体で SOUNDSTAT_MAX_CONCURRENCY に制限されます。
+
+    Args:
+        track_ids: SpotifyトラックIDのリスト。
+
+    Yields:
+        tuple: (track_id, track_info, failure_kind)。
+            取得に失敗した場合 track_info は None で、failure_kind に失敗の種類が入る。
+    """
+    executor = _get_executor()
+    future_to_track_id = {
+        executor.submit(fetch_soundstat_track_coalesced, track_id): track_id
+        for track_id in track_ids
+    }
+    try:
+        for future in as_completed(future_to_track_id):
+            track_id = future_to_track_id[future]
+            try:
+                track_info, failure_kind = future.result()
+                yield track_id, track_info, failure_kind
+            except Exception as e:
+                print(f"エラーが発生しました: {e}")
+                yield track_id, None, FAILURE_TRANSIENT
+    finally:
+        # 呼び出し側が途中で打ち切った場合、未着手のリクエストは破棄する
+        for future in future_to_track_id:
+            future.cancel()
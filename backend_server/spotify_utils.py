@@ -1,9 +1,14 @@
 # spotify_utils.py
 
 import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
 import requests
 import spotipy
+from spotipy.cache_handler import CacheFileHandler, MemoryCacheHandler
 from spotipy.oauth2 import SpotifyClientCredentials
+from playlist_cache import PlaylistItemsCache
 from dotenv import load_dotenv
 
 # --- 配置加载 ---
@@ -16,55 +21,186 @@ load_dotenv(dotenv_path=dotenv_path)
 
 SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+# 指定した場合、Client Credentialsのトークンをこのファイルに保存して同じマシン上のワーカー間で共有する
+SPOTIFY_TOKEN_CACHE_PATH = os.getenv('SPOTIFY_TOKEN_CACHE_PATH')
+
+_auth_manager = None
+_auth_manager_lock = threading.Lock()
+
+def get_client_credentials_manager() -> SpotifyClientCredentials:
+    """
+    プロセス内で共有するClient Credentialsの認証マネージャーを返す。
+    トークンはメモリ（SPOTIFY_TOKEN_CACHE_PATH を指定した場合はファイル）に保存される。
+    """
+    global _auth_manager
+    if _auth_manager is None:
+        client_id = SPOTIFY_CLIENT_ID or os.getenv('SPOTIFY_CLIENT_ID')
+        client_secret = SPOTIFY_CLIENT_SECRET or os.getenv('SPOTIFY_CLIENT_SECRET')
+        if not client_id or not client_secret:
+            raise ValueError("SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET must be set.")
+        if SPOTIFY_TOKEN_CACHE_PATH:
+            cache_handler = CacheFileHandler(cache_path=SPOTIFY_TOKEN_CACHE_PATH)
+        else:
+            cache_handler = MemoryCacheHandler()
+        _auth_manager = SpotifyClientCredentials(
+            client_id=client_id, client_secret=client_secret, cache_handler=cache_handler
+        )
+    return _auth_manager
 
 def get_spotify_access_token() -> str:
     """
     Spotify APIのアクセストークンを取得する (Client Credentials Flow)
+
+    トークンはプロセス内（SPOTIFY_TOKEN_CACHE_PATH を指定した場合はワーカー間）で共有し、
+    有効期限の60秒前までは再利用する。期限が近づいた場合のみ accounts.spotify.com に問い合わせる。
+    """
+    # 期限切れの直後に複数のスレッドが同時にトークンを取り直さないよう、1つずつ確認する
+    with _auth_manager_lock:
+        return get_client_credentials_manager().get_access_token(as_dict=False)
+
+# プレイリストの楽曲ページを同時に取得する数の上限（全プレイリスト・全リクエストで共有する）
+SPOTIFY_FETCH_MAX_CONCURRENCY = int(os.getenv('SPOTIFY_FETCH_MAX_CONCURRENCY', '8'))
+PLAYLIST_PAGE_SIZE = 100
+
+# プレイリストの楽曲一覧で要求するフィールド（楽曲IDのみ必要な分類処理用）
+PLAYLIST_TRACK_ID_FIELDS = 'items(track(id)),next,total'
+
+# プレイリストごとの楽曲一覧（snapshot_id が変わるまで再取得しない）
+playlist_items_cache = PlaylistItemsCache()
+
+_fetch_executor = ThreadPoolExecutor(max_workers=SPOTIFY_FETCH_MAX_CONCURRENCY, thread_name_prefix="spotify-fetch")
+
+def _fetch_playlist_page(sp: spotipy.Spotify, playlist_id: str, offset: int, fields: Optional[str]) -> dict:
+    return sp.playlist_items(playlist_id, fields=fields, limit=PLAYLIST_PAGE_SIZE, offset=offset)
+
+def get_playlist_snapshot_ids(
+    playlist_ids: list,
+    access_token: Optional[str] = None,
+    sp: Optional[spotipy.Spotify] = None
+) -> dict:
+    """
+    プレイリストごとの snapshot_id を並行して取得する（プレイリストの内容が変わると snapshot_id も変わる）。
+    楽曲一覧は取得せず、snapshot_id のみを要求する。
+
+    Args:
+        playlist_ids (list): SpotifyプレイリストIDのリスト。
+        access_token (str): Spotify APIのアクセストークン。sp を指定した場合は不要。
+        sp (spotipy.Spotify): 使用するクライアント（ユーザー認証のクライアントなど）。
+
+    Returns:
+        dict: {プレイリストID: snapshot_id}。取得に失敗したプレイリストは含まない。
+    """
+    sp = sp or spotipy.Spotify(auth=access_token)
+    futures = {
+        playlist_id: _fetch_executor.submit(sp.playlist, playlist_id, fields='snapshot_id')
+        for playlist_id in dict.fromkeys(playlist_ids)
+    }
+    snapshot_ids = {}
+    for playlist_id, future in futures.items():
+        try:
+            snapshot_ids[playlist_id] = future.result()['snapshot_id']
+        except Exception as e:
+            print(f"Error fetching playlist snapshot_id: {e}")
+    return snapshot_ids
+
+def get_playlists_tracks(
+    playlist_ids: list,
+    access_token: Optional[str] = None,
+    fields: Optional[str] = None,
+    snapshot_ids: Optional[dict] = None,
+    sp: Optional[spotipy.Spotify] = None,
+    raise_on_error: bool = False
+) -> dict:
+    """
+    複数のプレイリストの全楽曲を並行して取得する。
+
+    まず snapshot_id を確認し、前回取得時から変わっていないプレイリストは保存済みの楽曲一覧を使う。
+    それ以外は各プレイリストの最初のページで total を確認し、残りのページはoffsetを指定して同時に要求する。
+    全てのページ要求は共有のスレッドプール（SPOTIFY_FETCH_MAX_CONCURRENCY）で実行されるため、
+    取得時間は全プレイリストの合計ではなく、最も遅いプレイリストで決まる。
+
+    Args:
+        playlist_ids (list): SpotifyプレイリストIDのリスト。
+        access_token (str): Spotify APIのアクセストークン。sp を指定した場合は不要。
+        fields (str): 要求するフィールド（例: PLAYLIST_TRACK_ID_FIELDS）。省略時は全てのフィールド。
+            total を含めること（含まない場合は最初のページのみ取得する）。
+        snapshot_ids (dict): 取得済みの {プレイリストID: snapshot_id}。省略時はここで取得する。
+        sp (spotipy.Spotify): 使用するクライアント（ユーザー認証のクライアントなど）。
+        raise_on_error (bool): Trueの場合、取得できなかったページが1つでもあれば
+            全ての要求の完了後に最初の例外を送出する（一部だけの一覧を表示しないため）。
+
+    Returns:
+        dict: {プレイリストID: 楽曲項目のリスト（プレイリスト内の順序）}。
+            raise_on_error がFalseの場合、最初のページを取得できなかったプレイリストは空のリストになる。
     """
-    if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
-        raise ValueError("SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET must be set.")
-        
-    auth_manager = SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
-    access_token = auth_manager.get_access_token(as_dict=False)
-    return access_token
-
-def get_playlist_tracks(playlist_id: str, access_token: str) -> list:
+    sp = sp or spotipy.Spotify(auth=access_token)
+    if snapshot_ids is None:
+        snapshot_ids = get_playlist_snapshot_ids(playlist_ids, sp=sp)
+
+    results = {}
+    pages = {}
+    for playlist_id in dict.fromkeys(playlist_ids):
+        snapshot_id = snapshot_ids.get(playlist_id)
+        cached_items = playlist_items_cache.get(playlist_id, snapshot_id, fields) if snapshot_id else None
+        if cached_items is not None:
+            results[playlist_id] = cached_items
+        else:
+            pages[playlist_id] = {}
+    if results:
+        print(f"情報: {len(results)} 個のプレイリストは変更がないため、保存済みの楽曲一覧を使います。")
+
+    incomplete = set()
+    first_error = None
+    pending = {
+        _fetch_executor.submit(_fetch_playlist_page, sp, playlist_id, 0, fields): (playlist_id, 0)
+        for playlist_id in pages
+    }
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            playlist_id, offset = pending.pop(future)
+            try:
+                response = future.result()
+            except Exception as e:
+                incomplete.add(playlist_id)
+                first_error = first_error or e
+                if offset == 0:
+                    print(f"Error fetching initial playlist tracks: {e}")
+                else:
+                    # 取得できなかったページは飛ばし、取得できた部分を返す
+                    print(f"Error fetching page of tracks (offset={offset}): {e}")
+                continue
+
+            pages[playlist_id][offset] = response['items']
+            if offset == 0:
+                # 最初のページの total から残りのページを同時に要求する
+                for next_offset in range(PLAYLIST_PAGE_SIZE, response.get('total') or 0, PLAYLIST_PAGE_SIZE):
+                    future = _fetch_executor.submit(_fetch_playlist_page, sp, playlist_id, next_offset, fields)
+                    pending[future] = (playlist_id, next_offset)
+
+    for playlist_id, playlist_pages in pages.items():
+        items = [item for offset in sorted(playlist_pages) for item in playlist_pages[offset]]
+        results[playlist_id] = items
+        # 全てのページを取得できた場合のみ保存する
+        if playlist_id not in incomplete and snapshot_ids.get(playlist_id):
+            playlist_items_cache.put(playlist_id, snapshot_ids[playlist_id], items, fields)
+
+    if raise_on_error and first_error is not None:
+        raise first_error
+    return {playlist_id: results[playlist_id] for playlist_id in dict.fromkeys(playlist_ids)}
+
+def get_playlist_tracks(playlist_id: str, access_token: str, fields: Optional[str] = None) -> list:
     """
     获取指定Spotify播放列表中的所有曲目，自动处理分页以获取超过100首的歌曲。
+    第一页之后的分页会并发请求；snapshot_id 未变化时直接返回缓存（参见 get_playlists_tracks）。
 
     Args:
         playlist_id (str): Spotify播放列表的ID。
         access_token (str): 已获取的Spotify API访问令牌。
+        fields (str): 只请求指定的字段（例如 PLAYLIST_TRACK_ID_FIELDS）。省略时返回全部字段。
 
     Returns:
         list: 包含所有曲目项目的列表。
     """
-    # 使用获取到的访问令牌初始化spotipy客户端
-    sp = spotipy.Spotify(auth=access_token)
-    
-    # 初始化一个空列表来存储所有曲目
-    all_tracks = []
-    
-    # 第一次请求，获取第一页的100首歌曲
-    try:
-        response = sp.playlist_items(playlist_id, limit=100)
-    except Exception as e:
-        print(f"Error fetching initial playlist tracks: {e}")
-        return []
-
-    # 将第一页的曲目添加到列表中
-    all_tracks.extend(response['items'])
-    
-    # 检查返回结果中是否有'next'字段，如果有，说明还有下一页
-    while response['next']:
-        try:
-            # sp.next() 会自动请求'next'字段中的URL
-            response = sp.next(response)
-            # 将新一页的曲目追加到列表中
-            all_tracks.extend(response['items'])
-        except Exception as e:
-            print(f"Error fetching next page of tracks: {e}")
-            # 如果在获取某一页时出错，则中断循环并返回已获取的部分
-            break
-            
-    return all_tracks
+    return get_playlists_tracks([playlist_id], access_token, fields=fields)[playlist_id]
@@ -12,6 +12,7 @@ from sklearn.preprocessing import LabelEncoder
 import joblib
 from sklearn.linear_model import LogisticRegression
 import lightgbm as lgb
+from model_export import export_numpy_model
 
 # 各CSVファイルのパス
 dataset_files = {
@@ -109,6 +110,11 @@ for emotion, file_path in dataset_files.items():
     model_filename = f"model/model_{emotion.replace('/', '-')}.joblib"
     joblib.dump(model, model_filename)
     print(f"モデルを '{model_filename}' に保存しました。")
+    # 推論サーバー用に、sklearnなしで読み込める形式でも保存する（ロジスティック回帰のみ）
+    try:
+        export_numpy_model(model, model_filename.replace('.joblib', '.npz'))
+    except ValueError as e:
+        print(f"警告: {e}")
     
     y_pred = model.predict(X_test)
     y_pred_proba = model.predict_proba(X_test)
@@ -1,5 +1,6 @@
 # playlist_api.py
 import os
+import sys
 from fastapi import FastAPI, Depends, Header, HTTPException, Query
 from jose import jwt, JWTError
 import psycopg2
@@ -11,6 +12,10 @@ from dotenv import load_dotenv
 
 load_dotenv()  # .envから環境変数をロード
 
+# プレイリストの楽曲一覧の取得（snapshot_id によるキャッシュ・並行取得）は backend_server と共通の処理を使う
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend_server"))
+from spotify_utils import get_playlists_tracks
+
 app = FastAPI()
 
 # --- Env ---
@@ -35,6 +40,9 @@ print("DEBUG JWT_SECRET_KEY", JWT_SECRET_KEY)
 print("DEBUG FERNET_KEY", raw_FERNET_KEY)
 print("DEBUG SPOTIFY_CLIENT_ID    =", SPOTIFY_CLIENT_ID)
 
+# 表示用に必要なフィールド（楽曲ID・曲名・アーティスト名・ジャケット画像）のみを要求する
+DISPLAY_TRACK_FIELDS = "items(track(id,name,artists(name),album(images(url)))),next,total"
+
 # --- JWT から user_id を取り出す Dependency ---
 def get_current_user(authorization: str = Header(..., alias="Authorization")) -> str:
     scheme, _, token = authorization.partition(" ")
@@ -108,13 +116,11 @@ def get_emotion_playlist_tracks(
     if not target_id:
         raise HTTPException(status_code=404, detail="Playlist not found")
 
-    # プレイリストのトラックを全部取得
-    tracks = []
-    results = sp.playlist_items(target_id)
-    tracks += results["items"]
-    while results["next"]:
-        results = sp.next(results)
-        tracks += results["items"]
+    # プレイリストのトラックを全部取得（snapshot_id が変わっていなければ保存済みの一覧を使う）
+    try:
+        tracks = get_playlists_tracks([target_id], fields=DISPLAY_TRACK_FIELDS, sp=sp, raise_on_error=True)[target_id]
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch playlist tracks: {e}")
 
     # トラック情報を抽出
     track_info_list = []
@@ -141,14 +147,13 @@ def get_specific_playlist_tracks(
 ):
     track_info_list = []
     seen_track_ids = set()  # 重複を避けるためのセット
+    # 全てのプレイリストのトラックを並行して取得（snapshot_id が変わっていなければ保存済みの一覧を使う）
+    try:
+        tracks_by_playlist = get_playlists_tracks(playlist_ids, fields=DISPLAY_TRACK_FIELDS, sp=sp, raise_on_error=True)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch playlist tracks: {e}")
     for playlist_id in playlist_ids:
-        # プレイリストのトラックを全部取得
-        tracks = []
-        results = sp.playlist_items(playlist_id)
-        tracks += results["items"]
-        while results["next"]:
-            results = sp.next(results)
-            tracks += results["items"]
+        tracks = tracks_by_playlist[playlist_id]
 
         # トラック情報を抽出
         for item in tracks: